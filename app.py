@@ -5,24 +5,43 @@ import sqlite3
 import logging
 import re
 import json
+import hashlib
+import hmac
 import gzip
+import zlib
 import io
+import shutil
 import csv
+import click
+import threading
+import time
 import pandas as pd
-from collections import defaultdict
-from datetime import datetime, timedelta
+import itertools
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+from datetime import date, datetime, timedelta, timezone
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 from flask import (
     Flask, request, render_template, session,
-    redirect, url_for, jsonify, flash, send_file, Response
+    redirect, url_for, jsonify, flash, send_file, Response, make_response, g
 )
 from markupsafe import Markup, escape
-import plotly.graph_objs as go
-import plotly.io as pio
-import plotly.express as px
+from werkzeug.datastructures import MultiDict
 import bleach
 from io import StringIO, BytesIO
 import markdown
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet snapshots
+    pa = pq = None
 
 load_dotenv()
 
@@ -48,6 +67,56 @@ USER_LOGIN_LOG_PATH = 'logs/user_logins.log'
 FILES_OFFSETS_PATH = os.getenv('FILES_OFFSETS_PATH')
 PER_PAGE = 10
 
+# SQLite connection tuning (see connect_db)
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 15))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 256 << 20))
+DB_CACHE_KB = int(os.getenv('DB_CACHE_KB', 64 << 10))
+# Idle connections of each kind (writable, read-only) kept for later requests
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+
+# Processes used to parse log files during ingestion. 1 streams each file with
+# flat memory; more parse files in parallel but hold each parsed file whole.
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 1))
+# Rows per insert transaction
+INSERT_BATCH_SIZE = 5000
+# A log's last record may still gain lines (TESTER is optional), so it is only
+# ingested once the next record starts or the file has been idle this long
+LOG_TAIL_IDLE_SECONDS = float(os.getenv('LOG_TAIL_IDLE_SECONDS', 10))
+
+# Background log watcher (see app_watcher.py)
+WATCH_LOGS = os.getenv('WATCH_LOGS', '').lower() in ('1', 'true', 'yes')
+WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', 2))
+WATCH_MIN_INTERVAL = float(os.getenv('WATCH_MIN_INTERVAL', 5))
+WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', 5))
+# Caps the watcher's insert rate so reviewers' writes are not starved
+WATCH_MAX_ROWS_PER_SEC = int(os.getenv('WATCH_MAX_ROWS_PER_SEC', 2000))
+WATCH_BATCH_SIZE = 500
+
+# Instrumentation (see app_metrics.py and /metrics)
+METRICS_SQL = os.getenv('METRICS_SQL', '1').lower() in ('1', 'true', 'yes')
+# Lets a scraper read /metrics without a session: "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Requests slower than this are written to SLOW_REQUEST_LOG_PATH (0: off)
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 0))
+SLOW_REQUEST_LOG_PATH = 'logs/slow_requests.log'
+
+# Time zone the log timestamps are written in, and the default for the graph
+LOG_TIMEZONE = os.getenv('LOG_TIMEZONE', 'UTC')
+DISPLAY_TIMEZONE = os.getenv('DISPLAY_TIMEZONE', LOG_TIMEZONE)
+# Extra zones offered in the graph's time zone menu (comma-separated)
+GRAPH_TIMEZONES = [tz.strip() for tz in os.getenv('GRAPH_TIMEZONES', '').split(',') if tz.strip()]
+
+# Background jobs (ingest, rebuilds, exports); see "Background jobs"
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# Files written by export jobs, kept for EXPORT_RETENTION_HOURS
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+
+# Date-partitioned Parquet snapshots of the logs table (needs pyarrow, from
+# the optional "snapshots" extra)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_MISSING_PYARROW = ("Parquet snapshots need pyarrow; install the snapshots extra "
+                            "(uv sync --extra snapshots, or pip install '.[snapshots]').")
+
 # Allowed HTML tags/attributes for the response field
 ALLOWED_TAGS = ['a', 'br', 'code', 'pre', 'em', 'strong', 'p', 'span']
 ALLOWED_ATTRIBUTES = {
@@ -60,6 +129,12 @@ app.secret_key = FLASK_SECRET_KEY
 
 
 from app_auth import auth_bp, login_required
+from app_watcher import start_log_watcher
+from app_parse import COMPRESSED_OPENERS, iter_log_file, map_log_files, parse_log_file
+from app_metrics import (
+    Counter, Gauge, Histogram, InstrumentedConnection, render_metrics,
+    start_request_sql, finish_request_sql
+)
 app.register_blueprint(auth_bp)
 
 
@@ -87,6 +162,13 @@ user_login_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
 user_login_logger.addHandler(user_login_handler)
 user_login_logger.setLevel(logging.INFO)
 
+slow_request_logger = logging.getLogger('slow_requests')
+if SLOW_REQUEST_MS:
+    slow_request_handler = logging.FileHandler(SLOW_REQUEST_LOG_PATH)
+    slow_request_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_request_logger.addHandler(slow_request_handler)
+    slow_request_logger.setLevel(logging.INFO)
+
 
 # --- User helper functions ---
 def is_write_user(eppn):
@@ -102,333 +184,520 @@ def is_read_only_user(eppn):
     return False
 
 
-# --- Database initialization ---
-def init_db():
-    newly_created = False
-    if not os.path.exists(DB_FILE):
-        app.logger.info("Initializing new database.")
-        newly_created = True
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT,
-                    query TEXT,
-                    response TEXT,
-                    tool TEXT,
-                    tester TEXT,
-                    is_independent_question TEXT DEFAULT '',
-                    response_review TEXT DEFAULT '',
-                    query_review TEXT DEFAULT '',
-                    urls_review TEXT DEFAULT '',
-                    notes TEXT DEFAULT '',
-                    last_updated_by TEXT DEFAULT NULL,
-                    last_updated_at TEXT DEFAULT NULL
-                )
-            ''')
-            conn.commit()
+# --- Database connections ---
+# Connections are configured once and pooled. A request takes a writable and/or
+# a read-only connection from db_pool on first use and returns it at teardown;
+# up to DB_POOL_SIZE idle connections of each kind are kept, the rest closed.
+# Background threads (jobs, heartbeat, watcher) keep theirs while they live.
+# In WAL mode readers never wait for a writer (a review save or an ingest
+# batch), and writers queue for up to DB_BUSY_TIMEOUT seconds instead of
+# failing with "database is locked".
+db_local = threading.local()
+db_pool = {'reader': [], 'writer': []}
+db_pool_lock = threading.Lock()
+
+def connect_db(readonly=False):
+    factory = InstrumentedConnection if METRICS_SQL else sqlite3.Connection
+    # Pooled connections move between threads, though only one uses each at a time
+    if readonly:
+        conn = sqlite3.connect(f"{Path(DB_FILE).resolve().as_uri()}?mode=ro", uri=True,
+                               timeout=DB_BUSY_TIMEOUT, factory=factory, check_same_thread=False)
     else:
-        app.logger.info("Database already exists.")
-
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT, factory=factory,
+                               check_same_thread=False)
+    # WAL makes NORMAL durable across application crashes; only an OS crash
+    # can lose the last commits
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+    return conn
+
+def get_db(readonly=False):
+    """This thread's connection; read-only for GET endpoints and read-only users."""
+    key = 'reader' if readonly else 'writer'
+    conn = getattr(db_local, key, None)
+    if conn is None:
+        with db_pool_lock:
+            conn = db_pool[key].pop() if db_pool[key] else None
+        if conn is None:
+            conn = connect_db(readonly)
+        setattr(db_local, key, conn)
+    return conn
+
+@app.teardown_appcontext
+def release_db(exc):
+    """Return this context's connections to db_pool, or close them if it is full."""
+    for key in ('reader', 'writer'):
+        conn = getattr(db_local, key, None)
+        if conn is None:
+            continue
+        setattr(db_local, key, None)
+        # A failed request must not leave a transaction (and its lock) open on
+        # a pooled connection
+        if conn.in_transaction:
+            conn.rollback()
+        with db_pool_lock:
+            pooled = len(db_pool[key]) < DB_POOL_SIZE
+            if pooled:
+                db_pool[key].append(conn)
+        if not pooled:
+            conn.close()
+
+@contextmanager
+def write_transaction(conn):
+    """Take the write lock up front for read-modify-write transactions.
+
+    A deferred transaction that reads first cannot wait for the lock when it
+    later writes, and fails with "database is locked" under WAL.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+# --- Database schema ---
+# The schema is built by the numbered MIGRATIONS (see "Schema migrations"
+# below), applied once at startup. Every step must also be safe on databases
+# that already have the change, since those predate schema_version.
+def init_db(start_jobs=True):
+    """Create or upgrade the database; on first creation, ingest the logs."""
+    newly_created = not os.path.exists(DB_FILE)
+    if newly_created:
+        app.logger.info("Initializing new database.")
+    conn = get_db()
+    # Persistent: stored in the database file
+    conn.execute("PRAGMA journal_mode=WAL")
+    applied = migrate(conn)
+    if not start_jobs or not LOG_DIR:
+        return applied
+    # In the background, so the app starts serving while they run
     if newly_created:
-        logs = read_logs_from_files()
-        with sqlite3.connect(DB_FILE) as conn:
-            for log in logs:
-                insert_log(conn, log)
+        submit_job('ingest')
+    elif MODEL_COLUMN_MIGRATION in applied:
+        submit_job('backfill_models')
+    return applied
+
+db_ready = False
+db_ready_lock = threading.Lock()
+
+def ensure_db(start_jobs=True):
+    """Run init_db once per process, on first use rather than at import.
+
+    start_jobs=False (CLI commands) applies the migrations without queuing the
+    initial ingest or backfill, which would not outlive the command.
+    """
+    global db_ready
+    if db_ready:
+        return
+    with db_ready_lock:
+        if not db_ready:
+            init_db(start_jobs)
+            db_ready = True
+
+def create_logs_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            query TEXT,
+            response TEXT,
+            tool TEXT,
+            tester TEXT,
+            is_independent_question TEXT DEFAULT '',
+            response_review TEXT DEFAULT '',
+            query_review TEXT DEFAULT '',
+            urls_review TEXT DEFAULT '',
+            notes TEXT DEFAULT '',
+            last_updated_by TEXT DEFAULT NULL,
+            last_updated_at TEXT DEFAULT NULL
+        )
+    ''')
 
-# helper function for notes
-def ensure_notes_column():
+def add_notes_column(conn):
     """Add notes column if DB existed before notes was introduced."""
-    with sqlite3.connect(DB_FILE) as conn:
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(logs)")
-        cols = [row[1] for row in cur.fetchall()]  
-        if "notes" not in cols:
-            cur.execute("ALTER TABLE logs ADD COLUMN notes TEXT DEFAULT ''")
-            conn.commit()
-            app.logger.info("Added notes column to logs table.")
-
-
-def load_offsets():
-    if os.path.exists(FILES_OFFSETS_PATH):
-        with open(FILES_OFFSETS_PATH, 'r') as f:
-            return json.load(f)
-    return {}
-
-# Save current file positions
-def save_offsets(positions):
-    with open(FILES_OFFSETS_PATH, 'w') as f:
-        json.dump(positions, f)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+    if "notes" not in cols:
+        conn.execute("ALTER TABLE logs ADD COLUMN notes TEXT DEFAULT ''")
+        app.logger.info("Added notes column to logs table.")
+
+def add_model_column(conn):
+    """Add the model column; rows ingested before it are filled by backfill_models()."""
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(logs)")]
+    if "model" not in cols:
+        conn.execute("ALTER TABLE logs ADD COLUMN model TEXT DEFAULT ''")
+        app.logger.info("Added model column to logs table.")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_model_timestamp ON logs (model, timestamp)")
+
+def create_log_indexes(conn):
+    # Also serves ORDER BY timestamp, id: rowid is the implicit last key
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+    # Covering index for the metrics aggregation (no table row reads)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_logs_metrics ON logs (
+            timestamp, tool, is_independent_question, response_review,
+            query_review, urls_review, last_updated_at
+        )
+    ''')
+
+def ensure_logs_unique_index(conn):
+    """Deduplicate on (timestamp, query) with a UNIQUE index."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_logs_timestamp_query'"
+    ).fetchone()
+    if exists:
+        return
+    # Databases filled before the index existed may hold a few duplicates.
+    # Both copies could be reviewed, so keep the most recently reviewed one,
+    # else the first.
+    dropped = [row[0] for row in conn.execute('''
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY timestamp, query
+                ORDER BY last_updated_at IS NULL, last_updated_at DESC, id
+            ) AS copy
+            FROM logs
+        ) WHERE copy > 1
+    ''')]
+    if dropped:
+        conn.executemany("DELETE FROM logs WHERE id=?", [(log_id,) for log_id in dropped])
+        app.logger.info(f"Removed {len(dropped)} duplicate log rows: ids {dropped}")
+    conn.execute("CREATE UNIQUE INDEX idx_logs_timestamp_query ON logs (timestamp, query)")
+
+
+# --- File offsets ---
+# Offsets live in the database (not a JSON file) so that they are committed in
+# the same transaction as the rows read up to them: a crash can neither skip
+# nor double-ingest records.
+# Offsets are keyed by source name (the uncompressed `*_query.log` name) and
+# counted in uncompressed bytes, so a log and its compressed archive share one
+# position. `size` is the on-disk size when last read, used to skip archives.
+def ensure_offsets_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_offsets (
+            filename TEXT PRIMARY KEY,
+            inode INTEGER,
+            offset INTEGER NOT NULL DEFAULT 0,
+            size INTEGER,
+            compressed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(file_offsets)")]
+    if "size" not in cols:
+        conn.execute("ALTER TABLE file_offsets ADD COLUMN size INTEGER")
+        conn.execute("ALTER TABLE file_offsets ADD COLUMN compressed INTEGER NOT NULL DEFAULT 0")
+
+def load_offsets(conn):
+    rows = conn.execute("SELECT filename, inode, offset, size, compressed FROM file_offsets")
+    return {
+        name: {'inode': inode, 'offset': offset, 'size': size, 'compressed': bool(compressed)}
+        for name, inode, offset, size, compressed in rows
+    }
 
-def read_logs_from_files():
-    log_entries = []
-    start_date = datetime.min
-    end_date = datetime.now()
-    app.logger.info(f"Scanning log directory: {LOG_DIR}")
+# Save current file positions (caller commits)
+def save_offsets(conn, positions):
+    conn.executemany(
+        "INSERT OR REPLACE INTO file_offsets (filename, inode, offset, size, compressed) VALUES (?, ?, ?, ?, ?)",
+        [(name, pos['inode'], pos['offset'], pos['size'], int(pos['compressed']))
+         for name, pos in positions.items()]
+    )
 
-    for filename in sorted(os.listdir(LOG_DIR), reverse=True):
-        filepath = os.path.join(LOG_DIR, filename)
-        if not filename.endswith('_query.log'):
+def resume_offset(source, prev, st, compressed):
+    """Where to resume reading `source`, or None if nothing new can be there."""
+    if not prev:
+        return 0
+    if prev['inode'] == st.st_ino:
+        if compressed:
+            # An archive is complete once read
+            return None if prev['size'] == st.st_size else 0
+        if prev['offset'] <= st.st_size:
+            return prev['offset'] if prev['offset'] < st.st_size else None
+    elif compressed and not prev['compressed']:
+        # The log we were tailing has been compressed; same bytes, new inode
+        app.logger.info(f"Log file {source} was compressed; resuming at offset {prev['offset']}.")
+        return prev['offset']
+    app.logger.info(f"Log file {source} was rotated or truncated; re-reading from start.")
+    return 0
+
+# One ingest at a time per process (the Update Logs button and the watcher)
+ingest_lock = threading.Lock()
+
+def ingest_new_entries(workers=None, batch_size=INSERT_BATCH_SIZE, max_rows_per_sec=None, progress=None):
+    """Ingest only the bytes appended to each log file since the last run.
+
+    Files are parsed in parallel across `workers` processes (INGEST_WORKERS
+    by default); rows and offsets are written from this process, file by file.
+    `progress(percent, records)` is called inside each batch's transaction.
+    counts['held'] is the number of files whose last record was left for a
+    later run because the file changed within LOG_TAIL_IDLE_SECONDS.
+    """
+    workers = workers or INGEST_WORKERS
+    counts = {'inserted': 0, 'skipped': 0, 'bytes': 0, 'held': 0}
+    started = time.monotonic()
+    app.logger.info(f"Incremental ingest from log directory: {LOG_DIR} ({workers} workers)")
+
+    with ingest_lock, get_db() as conn:
+        offsets = load_offsets(conn)
+        tasks = []
+        for source, filepath, compressed in list_log_sources():
+            try:
+                st = os.stat(filepath)
+            except OSError as e:
+                app.logger.error(f"Error reading file {filepath}: {e}")
+                continue
+            offset = resume_offset(source, offsets.get(source), st, compressed)
+            if offset is not None:
+                # Archives are finished files, so their last record is not held back
+                hold = not compressed and time.time() - st.st_mtime < LOG_TAIL_IDLE_SECONDS
+                counts['held'] += hold
+                tasks.append((source, filepath, offset, hold, {
+                    'inode': st.st_ino, 'offset': offset,
+                    'size': st.st_size, 'compressed': compressed
+                }))
+
+        # A single worker streams each file; a pool hands back whole parsed files.
+        parse = parse_log_file if workers > 1 else iter_log_file
+        results = map_log_files(
+            parse, [(path, offset, hold) for _, path, offset, hold, _ in tasks], workers
+        )
+        # Percent done by bytes; archives count their compressed size, so it is rough
+        total_bytes = max(sum(pos['size'] - offset for _, _, offset, _, pos in tasks), 1)
+        seen = {'records': 0}
+        for (filename, filepath, offset, _, position), future in zip(tasks, results):
+
+            def records():
+                for log, end in future.result():
+                    position['offset'] = end
+                    seen['records'] += 1
+                    yield log
+
+            def before_commit(c):
+                save_offsets(c, {filename: position})
+                if progress:
+                    read = counts['bytes'] + position['offset'] - offset
+                    progress(read * 100 / total_bytes, seen['records'])
+
+            try:
+                # Each batch commits together with the offset it reached
+                result = insert_logs(
+                    conn, records(), batch_size=batch_size,
+                    before_commit=before_commit, max_rows_per_sec=max_rows_per_sec
+                )
+                counts['inserted'] += result['inserted']
+                counts['skipped'] += result['skipped']
+            except Exception as e:
+                conn.rollback()
+                app.logger.error(f"Error ingesting file {filepath}: {e}")
+            # Up to the last committed record (decompressed bytes for archives)
+            counts['bytes'] += position['offset'] - offset
+
+    elapsed = time.monotonic() - started
+    record_ingest(counts, elapsed)
+    app.logger.info(
+        f"Incremental ingest inserted {counts['inserted']} new log entries, "
+        f"skipped {counts['skipped']} duplicates in {elapsed:.1f}s "
+        f"({(counts['inserted'] + counts['skipped']) / max(elapsed, 1e-6):.0f} records/s, "
+        f"{counts['bytes'] / 1e6 / max(elapsed, 1e-6):.1f} MB/s)."
+    )
+    return counts
+
+def backfill_models(workers=None, batch_size=INSERT_BATCH_SIZE, progress=None):
+    """Re-parse every log file to fill in `model` on rows stored without one.
+
+    `progress(percent, rows updated)` is called after each batch commits.
+    """
+    workers = workers or INGEST_WORKERS
+    sources = list_log_sources()
+    parse = parse_log_file if workers > 1 else iter_log_file
+    updated = 0
+    with ingest_lock, get_db() as conn:
+        results = map_log_files(parse, [(path, 0, False) for _, path, _ in sources], workers)
+        for done, ((_, filepath, _), future) in enumerate(zip(sources, results)):
+            try:
+                rows = ((log['model'], log['timestamp'], log['query'])
+                        for log, _ in future.result() if log['model'])
+                for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                    with write_transaction(conn):
+                        n = conn.executemany(
+                            "UPDATE logs SET model=? WHERE timestamp=? AND query=? AND model=''", batch
+                        ).rowcount
+                        if n:
+                            bump_data_version(conn)
+                    updated += n
+                    if progress:
+                        progress(done * 100 / len(sources), updated)
+            except Exception as e:
+                app.logger.error(f"Error backfilling models from {filepath}: {e}")
+    app.logger.info(f"Backfilled the model of {updated} log entries.")
+    return updated
+
+# --- Log sources ---
+LOG_SUFFIX = '_query.log'
+
+def log_source_name(filename):
+    """The uncompressed log name for a log file or archive, else None."""
+    base, ext = os.path.splitext(filename)
+    if filename.endswith(LOG_SUFFIX):
+        return filename
+    if ext in COMPRESSED_OPENERS and base.endswith(LOG_SUFFIX):
+        return base
+    return None
+
+def list_log_sources():
+    """Return sorted (source, filepath, compressed) for the log files in LOG_DIR.
+
+    `source` is the uncompressed file name. While both a log and its archive
+    exist (mid-compression), the uncompressed file is used.
+    """
+    sources = {}
+    for filename in os.listdir(LOG_DIR):
+        source = log_source_name(filename)
+        if source is None:
             app.logger.info(f"Skipping file: {filename}")
-            continue
+        elif source == filename:
+            sources[source] = (os.path.join(LOG_DIR, filename), False)
+        else:
+            sources.setdefault(source, (os.path.join(LOG_DIR, filename), True))
+    return [(source, path, compressed) for source, (path, compressed) in sorted(sources.items())]
 
-        app.logger.info(f"Reading log file: {filepath}")
-        try:
-            with open(filepath, 'r') as f:
-                content = f.read()
-                log_entries.extend(parse_log(content, start_date, end_date))
-        except Exception as e:
-            app.logger.error(f"Error processing file {filepath}: {e}")
+LOG_INSERT_COLUMNS = (
+    'timestamp', 'query', 'response', 'model', 'tool', 'tester',
+    'is_independent_question', 'response_review',
+    'query_review', 'urls_review'
+)
 
-    try:
-        log_entries = sorted(
-            log_entries,
-            key=lambda x: datetime.strptime(x['timestamp'], '%Y-%m-%d %H:%M:%S,%f'),
-            reverse=True
-        )
-    except Exception as e:
-        app.logger.error(f"Error sorting log entries: {e}")
-
-    app.logger.info(f"Total log entries found: {len(log_entries)}")
-    return log_entries
-
-# --- Log parsing ---
-def parse_log(content, start_date, end_date):
-    pattern = re.compile(
-            r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - QUERY: (.*?)\nRESPONSE:\s+(.*?)(?:\n+|\s+)MODEL:\s+(.*?)\nTOOL: (.*?)(?:\nTESTER: (.*?))?(?=\n\d{4}-\d{2}-\d{2}|\Z)',
-                    re.DOTALL | re.MULTILINE
-            )
-    matches = pattern.finditer(content)
-    entries = []
-    for match in matches:
-        ts_str = match.group(1)
-        try:
-            ts = datetime.strptime(ts_str, '%Y-%m-%d %H:%M:%S,%f')
-        except ValueError:
-            continue
-        if start_date <= ts <= end_date:
-            response = match.group(3).strip()
-            # Remove any trailing lines consisting solely of '#' characters.
-            response = re.sub(r'\n#+\s*$', '', response)
-            entries.append({
-                'timestamp': ts_str,
-                'query': match.group(2).strip(),
-                'response': response,
-                'tool': match.group(5).strip(),
-                'tester': match.group(6).strip() if match.group(6) else '',
-                'is_independent_question': '',
-                'response_review': '',
-                'query_review': '',
-                'urls_review': ''
-            })
-    return entries
-
-def insert_log(conn, log):
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM logs WHERE timestamp=? AND query=?", (log['timestamp'], log['query']))
-    if c.fetchone()[0] == 0:
-        c.execute('''
-            INSERT INTO logs (
-                timestamp, query, response, tool, tester,
-                is_independent_question, response_review,
-                query_review, urls_review
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            log['timestamp'],
-            log['query'],
-            log['response'],
-            log['tool'],
-            log['tester'],
-            log['is_independent_question'],
-            log['response_review'],
-            log['query_review'],
-            log['urls_review']
-        ))
-        conn.commit()
-        app.logger.info(f"Inserted log with timestamp: {log['timestamp']}")
-    else:
-        app.logger.info(f"Log already exists for timestamp: {log['timestamp']}")
-
-# ------------------------------------- Function to build models graph --------------------------------
-# def generate_graph(logs):
-#     metrics = calculate_model_metrics(logs)
-
-#     # identify the stack that we want separated visually
-#     highlight_group = 'Not Reviewed'
-#     spacer_value1 = 0.05
-#     spacer_value2 = 0.1
-
-#     # print(f"This is the model_metrics dictionary: {metrics}")
-#     # Take dictionary and turn it into flat data
-#     flat_metrics = []
-#     for model, model_metrics in metrics.items():
-#         excellent = model_metrics.get('Excellent', 0)
-#         good = model_metrics.get('Good', 0)
-#         satisfactory = model_metrics.get('Satisfactory', 0)
-#         unsatisfactory = model_metrics.get("Unsatisfactory", 0)
-#         not_reviewed = model_metrics.get('Not Reviewed', 0)
-
-#         base_sum = excellent + good + unsatisfactory + satisfactory 
-#         total_sum = base_sum + not_reviewed
-        
-#         nr_nonzero = False 
-#         excellent_nonzero = False
-#         good_nonzero = False
-#         satisfactory_nonzero = False 
-#         unsatisfactory_nonzero = False 
-#         # print(f"This is the metrics dictionary for this {model}:\n{model_metrics}")
-#         for metric, val in model_metrics.items():
-#             if metric != 'Not Reviewed':
-#                 percent = pct(val, base_sum)
-
-#             if metric == 'Not Reviewed':
-#                 percent = pct(val, total_sum)
-#                 if val > 0:
-#                     nr_nonzero = True
-#             flat_metrics.append({
-#                 'Model': model, 'Metric': metric, 'Value': val,
-#                 'Percent': f'{percent:.1f}%', 'CustomHover': f'{metric}<br>{percent:.1f}'
-#             })
-            
-#             # Keep track of metrics with values of 0
-#             if metric == "Excellent" and val > 0:
-#                 excellent_nonzero = True
-#             if metric == "Good" and val > 0:
-#                 good_nonzero = True
-#             if metric == "Satisfactory" and val > 0:
-#                 satisfactory_nonzero = True 
-#             if metric == "Unsatisfactory" and val > 0:
-#                 unsatisfactory_nonzero = True
-
-#         # Assign spacer values based on whether metrics are nonzero
-#         if excellent_nonzero and good_nonzero:
-#             spacer_value1 = 0.01
-#         else:
-#             spacer_value1 = 0
-
-#         if excellent_nonzero or good_nonzero or satisfactory_nonzero or unsatisfactory_nonzero: 
-#             spacer_value2 = 0.05
-#         else:
-#             spacer_value2 = 0
-        
-#         # Add spacer into flat_metrics
-#         flat_metrics.append({
-#                     'Model': model, 'Metric': 'Spacer1', 'Value': spacer_value1,
-#                     'Percent': '', 'CustomHover': ''
-#                 })
-#         flat_metrics.append({
-#                     'Model': model, 'Metric': 'Spacer2', 'Value': spacer_value2,
-#                     'Percent': '', 'CustomHover': ''
-#                 })
-
-#     # Convert into a data frame
-#     if not flat_metrics:
-#         df = pd.DataFrame(columns=['Model', 'Metric', 'Value', 'Percent', 'CustomHover'])
-#     else: 
-#         df = pd.DataFrame(flat_metrics)
-
-#     # Custom color map
-#     color_map = {
-#         'Excellent': 'rgba(31,255,0,0.4)',
-#         'Unsatisfactory': 'rgba(255, 99, 71, 0.8)',
-#         'Good': 'rgba(31,255,0,0.4)',
-#         "Satisfactory": 'rgba(255,255,0,0.7)',
-#         "Not Reviewed": 'rgba(180, 180, 180, 1)',
-#         "Spacer1": 'rgba(0,0,0,0)',
-#         "Spacer2": 'rgba(0,0,0,0)'
-#     }
-#     category_order = ['Excellent', 'Spacer1', 'Good', 'Satisfactory', "Unsatisfactory", "Spacer2", "Not Reviewed"]
-
-#     # Step 4: Build the plot
-#     fig = px.bar(
-#         df,
-#         x='Model',
-#         y='Value',
-#         color='Metric',
-#         color_discrete_map=color_map,
-#         category_orders={'Metric': category_order},
-#         custom_data=['CustomHover'],
-#         barmode='stack'
-#     )
-
-#     # Step 5: Customize hover tooltips
-#     fig.update_traces(
-#         hovertemplate='%{customdata[0]}<extra></extra>' if not df.empty else '',
-#         selector=lambda trace: trace.name != 'Spacer1' or trace.name != 'Spacer2'
-#     )
-
-#     # Hide spacer from legend and tooltip
-#     fig.for_each_trace(lambda trace: trace.update(showlegend=False, hoverinfo='skip') if trace.name == 'Spacer1' or trace.name == 'Spacer2' else ())
-
-#     # Update layout with axis labels and template
-#     fig.update_layout(
-#         xaxis_title="Model",
-#         yaxis_title="Number of Queries",
-#         title="Accuracy of Responses by Model",
-#         template="plotly_white",
-#         yaxis=dict(
-#         tickmode='linear',
-#         dtick=1  # Force tick marks at every 1 unit
-#         )
-#     )
-
-#     if df.empty:
-#         fig.add_annotation(
-#             text="No data available",
-#             xref="paper", yref="paper",
-#             x=0.5, y=0.5, showarrow=False,
-#             font=dict(size=16),
-#             align="center"
-#         )
-    
-#     # return fig
-#     return pio.to_html(fig, full_html=False, include_plotlyjs='cdn')
+def insert_logs(conn, logs, batch_size=INSERT_BATCH_SIZE, before_commit=None, max_rows_per_sec=None):
+    """Bulk-insert parsed entries, one transaction per batch.
 
-def generate_graph(metrics):
-    dates = list(metrics.keys())
-    vals = list(metrics.values())
-    fig = go.Figure(data=go.Scatter(x=dates, y=vals, mode='lines+markers', name='Queries'))
-    fig.update_layout(
-        title='Number of Queries',
-        xaxis_title='Date',
-        yaxis_title='Count',
-        template='plotly_white',
-        height=400,
-        margin=dict(l=40, r=40, t=40, b=40)
+    Entries already in the table (same timestamp and query) are skipped by
+    the unique index. `before_commit(conn)` runs inside each batch's
+    transaction, just before it commits. With `max_rows_per_sec`, pauses
+    between batches to stay under that rate. Returns inserted/skipped counts.
+    """
+    sql = "INSERT OR IGNORE INTO logs ({}) VALUES ({})".format(
+        ', '.join(LOG_INSERT_COLUMNS), ', '.join('?' for _ in LOG_INSERT_COLUMNS)
     )
-    return pio.to_html(fig, full_html=False)
+    counts = {'inserted': 0, 'skipped': 0}
+
+    def flush(batch):
+        started = time.monotonic()
+        # rowcount excludes the rows written by the rollup triggers
+        inserted = conn.executemany(sql, batch).rowcount
+        if inserted:
+            bump_data_version(conn)
+        if before_commit:
+            before_commit(conn)
+        conn.commit()
+        counts['inserted'] += inserted
+        counts['skipped'] += len(batch) - inserted
+        if max_rows_per_sec:
+            time.sleep(max(0, len(batch) / max_rows_per_sec - (time.monotonic() - started)))
 
-def get_week_range(year, week_num):
-    start_of_year = datetime(year, 1, 1)
-    start_of_week = start_of_year + timedelta(weeks=week_num - 1)
-    start_of_week -= timedelta(days=start_of_week.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-    return start_of_week.strftime('%Y-%m-%d'), end_of_week.strftime('%Y-%m-%d')
-
-def calculate_metrics(logs, view_by):
-    metrics = defaultdict(int)
+    batch = []
     for log in logs:
-        dt_str = log['timestamp'].split(' ')[0]
-        dt = datetime.strptime(dt_str, '%Y-%m-%d')
-        if view_by == 'daily':
-            key = dt.strftime('%Y-%m-%d')
-        elif view_by == 'weekly':
-            y, w = dt.isocalendar()[:2]
-            start, end = get_week_range(y, w)
-            key = f"{start} - {end}"
-        else:  # monthly
-            key = dt.strftime('%Y-%m')
-        metrics[key] += 1
-
-    if view_by == 'weekly':
-        sorted_metrics = dict(sorted(
-            metrics.items(),
-            key=lambda x: datetime.strptime(x[0].split(' - ')[0], '%Y-%m-%d')
-        ))
-    else:
-        sorted_metrics = dict(sorted(metrics.items(), key=lambda x: x[0]))
-    return sorted_metrics
+        batch.append(tuple(log[k] for k in LOG_INSERT_COLUMNS))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+    return counts
 
+def generate_graph(metrics):
+    """Plotly figure JSON for the query count graph; the page draws it with plotly.js."""
+    axis = dict(gridcolor='#EBF0F8', zerolinecolor='#EBF0F8')
+    return {
+        'data': [dict(type='scatter', x=list(metrics.keys()), y=list(metrics.values()),
+                      mode='lines+markers', name='Queries')],
+        'layout': dict(
+            title=dict(text='Number of Queries'),
+            xaxis=dict(axis, title=dict(text='Date')),
+            yaxis=dict(axis, title=dict(text='Count')),
+            plot_bgcolor='white',
+            height=400,
+            margin=dict(l=40, r=40, t=40, b=40)
+        )
+    }
+
+@lru_cache(maxsize=256)
+def cached_graph(filters, view_by, tz, version):
+    """Graph JSON for one filter; `version` (the data version) only keys the cache."""
+    with get_db(readonly=True) as conn:
+        return generate_graph(graph_metrics(conn.cursor(), filters, view_by, tz))
+
+def graph_metrics(c, filters, view_by, tz, daily=None):
+    """{bucket label: query count} for the graph, oldest first, empty buckets included.
+
+    Days, weeks and months in the log time zone come from the per-day counts
+    (`daily` if the caller has them) and the calendar table. Hours, and any
+    view in another time zone, come from the hourly rollup.
+    """
+    if view_by in CALENDAR_VIEWS and tz == LOG_TIMEZONE:
+        if daily is None:
+            daily = query_filter_counts(c, filters)
+        return calculate_metrics(daily, view_by, calendar_days(c, filters.start_date, filters.end_date))
+    return bucket_hours(query_hourly_totals(c, filters), view_by, tz, filters.start_date, filters.end_date)
+
+def calculate_metrics(daily, view_by, days):
+    """Bucket per-day counts (from query_daily_counts) by day, week or month.
+
+    `days` are the calendar rows of the date range, in order, so buckets come
+    out sorted and days without logs count as 0.
+    """
+    metrics = {}
+    for day, week, month in days:
+        key = day if view_by == 'daily' else week if view_by == 'weekly' else month
+        counts = daily.get(day)
+        metrics[key] = metrics.get(key, 0) + (counts['total'] if counts else 0)
+    return metrics
+
+def query_hourly_totals(c, filters):
+    """{hour key: count} for a filter: from metrics_hourly unless it has a search."""
+    if filters.match:
+        where, params = filters.log_sql()
+        c.execute(f"SELECT {HOUR_KEY_SQL.format(row='')}, COUNT(*) FROM logs WHERE {where} GROUP BY 1", params)
+    else:
+        where, params = filters.rollup_sql(hourly=True)
+        c.execute(f"SELECT hour_key, SUM(count) FROM metrics_hourly WHERE {where} GROUP BY 1", params)
+    return dict(c.fetchall())
+
+def bucket_hours(hours, view_by, tz, start_date, end_date):
+    """Bucket {hour key: count} (log time) by hour, day, week or month in `tz`.
+
+    Work is per hour of the range, whatever the number of logs. The hourly
+    view covers at most the last GRAPH_MAX_HOURLY_DAYS days of the range.
+    """
+    first, last = day_key(start_date), day_key(end_date)
+    if first is None or last is None or first > last:
+        return {}
+    first = max(first, CALENDAR_FIRST_KEY, last - GRAPH_MAX_HOURLY_DAYS + 1 if view_by == 'hourly' else first)
+    last = min(last, CALENDAR_LAST_KEY)
+    label = BUCKET_LABELS[view_by]
+    log_zone, zone = time_zone(LOG_TIMEZONE), time_zone(tz)
+
+    def local(hour):
+        # Naive log time -> aware time in the display zone
+        return (EPOCH + timedelta(hours=hour)).replace(tzinfo=log_zone).astimezone(zone)
+
+    metrics = {}
+    if view_by == 'hourly':
+        # Step in UTC so that DST changes neither skip nor repeat an hour
+        t, end = local(first * 24).astimezone(timezone.utc), local(last * 24 + 23).astimezone(timezone.utc)
+        while t <= end:
+            metrics[label(t.astimezone(zone))] = 0
+            t += timedelta(hours=1)
+    else:
+        d, end = local(first * 24).date(), local(last * 24 + 23).date()
+        while d <= end:
+            metrics.setdefault(label(d), 0)
+            d += timedelta(days=1)
+    for hour in sorted(hours):
+        if first * 24 <= hour <= last * 24 + 23:
+            key = label(local(hour))
+            metrics[key] = metrics.get(key, 0) + hours[hour]
+    return metrics
 
 def is_reviewed(log):
     return any([
@@ -439,263 +708,1526 @@ def is_reviewed(log):
         log.get('last_updated_at')
     ])
 
-def cnt(reviewed_logs, field, val):
-    return sum(1 for l in reviewed_logs if l.get(field) == val)
-
 
 # Percentage helpers
 def pct(x, base): return round(x / base * 100, 1) if base > 0 else 0
 
 # -------------------------- Helper for building models graph ------------------------------
-def calculate_model_metrics(logs):
-    models = set()
-    for log in logs:
-        models.add(log['model'])
-    
-    # print(f"This is the set of models {models}")
-    models_metrics = {model: {} for model in models}
-    # models_metrics = defaultdict(dict)
-    # models_metrics.keys = models
-    for model in models_metrics.keys():
-        model_logs = [l for l in logs if l['model'] == model]
-        reviewed_logs = [l for l in model_logs if is_reviewed(l)]
-        models_metrics[model] = {
-            "Not Reviewed": len(model_logs) - len(reviewed_logs),
-            "Excellent": cnt(reviewed_logs, "response_review", "Excellent"),
-            "Good": cnt(reviewed_logs, "response_review", "Good"),
-            "Satisfactory": cnt(reviewed_logs, "response_review", "Satisfactory"),
-            "Unsatisfactory": cnt(reviewed_logs, "response_review", "Unsatisfactory"),
-        }
-    return models_metrics
-
-def calculate_review_counts(logs):
-    total = len(logs)
-    reviewed_logs = [l for l in logs if is_reviewed(l)]
-    not_reviewed_logs = [l for l in logs if not is_reviewed(l)]
-    indep_yes = sum(1 for l in reviewed_logs if l['is_independent_question'] == "Yes")
-    indep_no = sum(1 for l in reviewed_logs if l['is_independent_question'] == "No")
+MODEL_GRAPH_SERIES = [  # (label, metric key, colour), stacked bottom to top
+    ('Excellent', 'resp_excellent', 'rgba(31,180,0,0.6)'),
+    ('Good', 'resp_good', 'rgba(31,255,0,0.4)'),
+    ('Satisfactory', 'resp_satisfactory', 'rgba(255,255,0,0.7)'),
+    ('Unsatisfactory', 'resp_unsatisfactory', 'rgba(255, 99, 71, 0.8)'),
+    ('Not Reviewed', 'not_reviewed', 'rgba(180, 180, 180, 1)'),
+]
+
+def calculate_model_metrics(by_model):
+    """{model: every METRIC_KEYS count} from query_filter_counts(..., by='model')."""
+    return {
+        model: metric_counts(calculate_review_counts({model: counts}))
+        for model, counts in sorted(by_model.items())
+    }
 
+def generate_model_graph(model_metrics):
+    """Plotly figure JSON: response ratings and unreviewed queries, stacked per model."""
+    models = list(model_metrics)
+    labels = [model or '(unknown)' for model in models]
+    data = []
+    for label, key, color in MODEL_GRAPH_SERIES:
+        values = [model_metrics[model][key] for model in models]
+        data.append(dict(
+            type='bar', name=label, x=labels, y=values, marker=dict(color=color),
+            customdata=[pct(v, model_metrics[model]['total']) for v, model in zip(values, models)],
+            hovertemplate=f'{label}: %{{y}} (%{{customdata}}% of queries)<extra></extra>'
+        ))
+    axis = dict(gridcolor='#EBF0F8', zerolinecolor='#EBF0F8')
     return {
-        "total": total,
-        "reviewed": len(reviewed_logs),
-        "not_reviewed": len(not_reviewed_logs),
-        "indep_yes": indep_yes,
-        "indep_no": indep_no,
-        "resp_excellent": cnt(reviewed_logs, "response_review", "Excellent"),
-        "resp_good": cnt(reviewed_logs, "response_review", "Good"),
-        "resp_satisfactory": cnt(reviewed_logs, "response_review", "Satisfactory"),
-        "resp_unsatisfactory": cnt(reviewed_logs, "response_review", "Unsatisfactory"),
-        "query_good": cnt(reviewed_logs, "query_review", "Good"),
-        "query_acceptable": cnt(reviewed_logs, "query_review", "Acceptable"),
-        "query_bad": cnt(reviewed_logs, "query_review", "Bad"),
-        "query_idk": cnt(reviewed_logs, "query_review", "I Don't Know"),
-        "urls_good": cnt(reviewed_logs, "urls_review", "Good"),
-        "urls_acceptable": cnt(reviewed_logs, "urls_review", "Acceptable"),
-        "urls_bad": cnt(reviewed_logs, "urls_review", "Bad"),
-        "urls_idk": cnt(reviewed_logs, "urls_review", "I Don't Know")
+        'data': data,
+        'layout': dict(
+            title=dict(text='Accuracy of Responses by Model'),
+            barmode='stack',
+            xaxis=dict(axis, title=dict(text='Model')),
+            yaxis=dict(axis, title=dict(text='Number of Queries')),
+            plot_bgcolor='white',
+            height=400,
+            margin=dict(l=40, r=40, t=40, b=40)
+        )
     }
 
+@lru_cache(maxsize=256)
+def cached_model_graph(filters, version):
+    """Per-model counts and graph for one filter; `version` only keys the cache."""
+    with get_db(readonly=True) as conn:
+        model_metrics = calculate_model_metrics(query_filter_counts(conn.cursor(), filters, by='model'))
+    return {'models': model_metrics, 'figure': generate_model_graph(model_metrics)}
+
+def list_models(c):
+    c.execute("SELECT DISTINCT model FROM metrics_daily WHERE model<>'' ORDER BY model")
+    return [row[0] for row in c.fetchall()]
+
+# --- Calendar ---
+# One row per day from CALENDAR_START to CALENDAR_END, keyed by days since
+# 1970-01-01 (the hourly rollup's hour_key // 24), with the day's ISO week and
+# month precomputed, so grouping days into graph buckets needs no date parsing.
+CALENDAR_START = date(1970, 1, 1)
+CALENDAR_END = date(2099, 12, 31)
+EPOCH = datetime(1970, 1, 1)
+CALENDAR_FIRST_KEY = 0
+CALENDAR_LAST_KEY = (CALENDAR_END - CALENDAR_START).days
+# The graph views served straight from the calendar (in the log time zone)
+CALENDAR_VIEWS = ('daily', 'weekly', 'monthly')
+VIEW_BY_OPTIONS = ('hourly', *CALENDAR_VIEWS)
+GRAPH_MAX_HOURLY_DAYS = 92
+
+def get_week_range(year, week_num):
+    """(Monday, Sunday) of ISO week `week_num` of ISO year `year`, as YYYY-MM-DD."""
+    start_of_week = date.fromisocalendar(year, week_num, 1)
+    return start_of_week.isoformat(), (start_of_week + timedelta(days=6)).isoformat()
+
+def week_label(day):
+    return ' - '.join(get_week_range(*day.isocalendar()[:2]))
+
+# Bucket label of a display-zone datetime (or date, for the calendar views)
+BUCKET_LABELS = {
+    'hourly': lambda t: t.strftime('%Y-%m-%d %H:00'),
+    'daily': lambda d: d.strftime('%Y-%m-%d'),
+    'weekly': week_label,
+    'monthly': lambda d: d.strftime('%Y-%m'),
+}
+
+def create_calendar(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS calendar (
+            day_key INTEGER PRIMARY KEY,
+            day TEXT NOT NULL UNIQUE,
+            iso_year INTEGER NOT NULL,
+            iso_week INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            month TEXT NOT NULL
+        )
+    ''')
+    days = (CALENDAR_START + timedelta(days=i) for i in range(CALENDAR_LAST_KEY + 1))
+    conn.executemany(
+        "INSERT OR IGNORE INTO calendar VALUES (?, ?, ?, ?, ?, ?)",
+        (((d - CALENDAR_START).days, d.isoformat(), *d.isocalendar()[:2], week_label(d), d.strftime('%Y-%m'))
+         for d in days)
+    )
+
+def day_key(day):
+    """Days since 1970-01-01 of a YYYY-MM-DD string; None if it is not a date."""
+    try:
+        return (date.fromisoformat(day) - CALENDAR_START).days
+    except (TypeError, ValueError):
+        return None
+
+def calendar_days(c, start_date, end_date):
+    """(day, week label, month) of every calendar day in the range, in order."""
+    c.execute("SELECT day, week, month FROM calendar WHERE day BETWEEN ? AND ? ORDER BY day_key",
+              (start_date, end_date))
+    return c.fetchall()
+
+@lru_cache(maxsize=64)
+def time_zone(name):
+    return ZoneInfo(name)
+
+def graph_timezone(name):
+    """`name` if it is a known time zone, else DISPLAY_TIMEZONE."""
+    try:
+        time_zone(name)
+        return name
+    except (TypeError, ValueError, KeyError):  # ZoneInfoNotFoundError is a KeyError
+        return DISPLAY_TIMEZONE
+
+# Every graph falls back on these, so a typo must stop the app, not each page
+for setting, zone_name in (('LOG_TIMEZONE', LOG_TIMEZONE), ('DISPLAY_TIMEZONE', DISPLAY_TIMEZONE)):
+    try:
+        time_zone(zone_name)
+    except (TypeError, ValueError, KeyError):
+        raise RuntimeError(f"{setting}={zone_name!r} is not a known time zone (e.g. 'UTC', 'America/Chicago').")
+
+def graph_options(args):
+    """(view_by, tz) of a request's graph, unknown values replaced by the defaults."""
+    view_by = args.get('view_by', 'daily')
+    if view_by not in VIEW_BY_OPTIONS:
+        view_by = 'daily'
+    return view_by, graph_timezone(args.get('tz') or DISPLAY_TIMEZONE)
+
+# --- Metrics aggregation ---
+# Every count is computed in SQLite in one grouped pass over the review
+# columns (served by idx_logs_metrics), never reading query/response.
+REVIEW_COUNT_FIELDS = [
+    ("indep_yes", "is_independent_question", "Yes"),
+    ("indep_no", "is_independent_question", "No"),
+    ("resp_excellent", "response_review", "Excellent"),
+    ("resp_good", "response_review", "Good"),
+    ("resp_satisfactory", "response_review", "Satisfactory"),
+    ("resp_unsatisfactory", "response_review", "Unsatisfactory"),
+    ("query_good", "query_review", "Good"),
+    ("query_acceptable", "query_review", "Acceptable"),
+    ("query_bad", "query_review", "Bad"),
+    ("query_idk", "query_review", "I Don't Know"),
+    ("urls_good", "urls_review", "Good"),
+    ("urls_acceptable", "urls_review", "Acceptable"),
+    ("urls_bad", "urls_review", "Bad"),
+    ("urls_idk", "urls_review", "I Don't Know"),
+]
+
+def reviewed_sql(prefix=''):
+    """SQL form of is_reviewed(); prefix is e.g. 'new.' inside a trigger."""
+    return "(" + " OR ".join(
+        f"COALESCE({prefix}{col}, '')<>''" for col in (
+            'is_independent_question', 'response_review',
+            'query_review', 'urls_review', 'last_updated_at'
+        )
+    ) + ")"
+
+def query_daily_counts(c, where, params, rollup=False, by='day'):
+    """Return {day: {'total', 'reviewed', <REVIEW_COUNT_FIELDS keys>}} for the filter.
+
+    With rollup, `where` applies to metrics_daily instead of logs. by='model'
+    groups by model instead of day.
+    """
+    if rollup:
+        day, weight, reviewed, table = "day", "count", "reviewed", "metrics_daily"
+    else:
+        day, weight, reviewed, table = "substr(timestamp, 1, 10)", "1", reviewed_sql(), "logs"
+    group = day if by == 'day' else "COALESCE(model, '')"
+    sums = ", ".join(f"SUM(({col} = ?) * {weight})" for _, col, _ in REVIEW_COUNT_FIELDS)
+    c.execute(
+        f"SELECT {group}, SUM({weight}), SUM({reviewed} * {weight}), {sums}"
+        f" FROM {table} WHERE {where} GROUP BY 1",
+        [*(val for _, _, val in REVIEW_COUNT_FIELDS), *params]
+    )
+    keys = ['total', 'reviewed'] + [key for key, _, _ in REVIEW_COUNT_FIELDS]
+    return {row[0]: dict(zip(keys, row[1:])) for row in c.fetchall()}
+
+# --- Filters ---
+# Every endpoint parses its query string into a LogFilter. It is hashable, so
+# it can key result caches, and compiles to SQL whose text depends only on
+# the filter's shape (which filters are set and how many values each has):
+# requests with the same shape reuse one statement from sqlite3's cache.
+REVIEW_STATUSES = ('All', 'Reviewed', 'Not Reviewed')
+# (field, column) of the filters that compare a column with chosen values
+VALUE_FILTERS = (
+    ('tool', 'tool'),
+    ('model', 'model'),
+    ('independent', 'is_independent_question'),
+    ('response_reviews', 'response_review'),
+    ('query_reviews', 'query_review'),
+    ('urls_reviews', 'urls_review'),
+)
+
+class LogFilter(NamedTuple):
+    start_date: str
+    end_date: str
+    tool: str = 'All'
+    model: str = 'All'
+    independent: str = 'All'
+    response_reviews: tuple = ()
+    query_reviews: tuple = ()
+    urls_reviews: tuple = ()
+    review_status: str = 'All'
+    search: str = ''
+
+    @classmethod
+    def from_args(cls, args, start_date=None, end_date=None):
+        """Normalize request args: sorted unique review values, collapsed whitespace."""
+        def values(name):
+            return tuple(sorted({v for v in args.getlist(name) if v}))
+
+        review_status = args.get('review_status', 'All')
+        return cls(
+            start_date=args.get('start_date', start_date),
+            end_date=args.get('end_date', end_date),
+            tool=args.get('tool') or 'All',
+            model=args.get('model') or 'All',
+            independent=args.get('independent') or 'All',
+            response_reviews=values('response_review'),
+            query_reviews=values('query_review'),
+            urls_reviews=values('urls_review'),
+            review_status=review_status if review_status in REVIEW_STATUSES else 'All',
+            search=' '.join(args.get('search', '').split()),
+        )
+
+    @property
+    def match(self):
+        """The FTS5 query for `search`, or '' if there is nothing to search."""
+        return fts_match(self.search)
+
+    @property
+    def shape(self):
+        counts = tuple(
+            len(value) if isinstance(value, tuple) else int(value != 'All')
+            for value in (getattr(self, field) for field, _ in VALUE_FILTERS)
+        )
+        return counts + (self.review_status, bool(self.match))
+
+    def value_params(self):
+        params = []
+        for field, _ in VALUE_FILTERS:
+            value = getattr(self, field)
+            if isinstance(value, tuple):
+                params.extend(value)
+            elif value != 'All':
+                params.append(value)
+        return params
+
+    def log_sql(self, search=True):
+        """(WHERE clause, params) on logs; search=False leaves out the text match."""
+        params = [f"{self.start_date} 00:00:00,000", f"{self.end_date} 23:59:59,999", *self.value_params()]
+        shape = self.shape if search else self.shape[:-1] + (False,)
+        if shape[-1]:
+            params.append(self.match)
+        return compile_where(shape, rollup=False), params
+
+    def rollup_sql(self, hourly=False):
+        """(WHERE clause, params) on metrics_daily (or metrics_hourly); it cannot apply a search."""
+        if hourly:
+            start, end = day_key(self.start_date), day_key(self.end_date)
+            bounds = [start * 24 if start is not None else None, end * 24 + 23 if end is not None else None]
+        else:
+            bounds = [self.start_date, self.end_date]
+        return compile_where(self.shape[:-1] + (False,), rollup='hour_key' if hourly else 'day'), [
+            *bounds, *self.value_params()
+        ]
+
+    def query_string(self):
+        pairs = [('start_date', self.start_date), ('end_date', self.end_date),
+                 ('tool', self.tool), ('model', self.model), ('independent', self.independent),
+                 ('review_status', self.review_status)]
+        pairs += [('response_review', v) for v in self.response_reviews]
+        pairs += [('query_review', v) for v in self.query_reviews]
+        pairs += [('urls_review', v) for v in self.urls_reviews]
+        if self.search:
+            pairs.append(('search', self.search))
+        return urlencode(pairs)
+
+@lru_cache(maxsize=256)
+def compile_where(shape, rollup):
+    """SQL text of a filter shape, on logs or, with rollup set to the bucket
+    column ('day' or 'hour_key'), on a rollup table."""
+    *counts, review_status, search = shape
+    where = f"{rollup} BETWEEN ? AND ?" if rollup else "timestamp BETWEEN ? AND ?"
+    for (field, col), n in zip(VALUE_FILTERS, counts):
+        if n == 1:
+            where += f" AND {col}=?"
+        elif n:
+            where += f" AND {col} IN ({','.join('?' for _ in range(n))})"
+    if review_status == "Reviewed":
+        where += " AND reviewed=1" if rollup else " AND (" + " OR ".join([
+            "is_independent_question<>''",
+            "response_review<>''",
+            "query_review<>''",
+            "urls_review<>''",
+            "last_updated_at IS NOT NULL"
+        ]) + ")"
+    elif review_status == "Not Reviewed":
+        where += " AND reviewed=0" if rollup else " AND (" + " AND ".join([
+            "is_independent_question=''",
+            "response_review=''",
+            "query_review=''",
+            "urls_review=''",
+            "last_updated_at IS NULL"
+        ]) + ")"
+    if search:
+        where += " AND id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)"
+    return where
+
+def query_filter_counts(c, filters, by='day'):
+    """Daily (or by='model') counts for a filter: from the rollup unless it has a search."""
+    if filters.match:
+        return query_daily_counts(c, *filters.log_sql(), by=by)
+    return query_daily_counts(c, *filters.rollup_sql(), rollup=True, by=by)
+
+# --- Metrics rollups ---
+# metrics_daily holds one row per (day, tool, review values, reviewed) with
+# the number of logs in it; metrics_hourly the same per hour, for the hourly
+# and time-zone graph views. Triggers on logs keep both current in the same
+# transaction as every insert, review update or delete.
+ROLLUP_DIMS = ('tool', 'model', 'is_independent_question', 'response_review', 'query_review', 'urls_review')
+# Hours since 1970-01-01 00:00 of a log's (naive) timestamp, 0 if it is not a
+# valid date; `row` is '' or e.g. 'new.'
+HOUR_KEY_SQL = "COALESCE(CAST(strftime('%s', substr({row}timestamp, 1, 13) || ':00') AS INTEGER), 0) / 3600"
+# table: (bucket column, its type, its value for a logs row, trigger name prefix)
+ROLLUP_TABLES = {
+    'metrics_daily': ('day', 'TEXT', "substr({row}timestamp, 1, 10)", 'logs_rollup'),
+    'metrics_hourly': ('hour_key', 'INTEGER', HOUR_KEY_SQL, 'logs_hourly_rollup'),
+}
+
+def ensure_rollups(conn, columns=ROLLUP_DIMS, table='metrics_daily'):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone()
+    if exists:
+        return
+    bucket, bucket_type, bucket_sql, trigger = ROLLUP_TABLES[table]
+    dims = ', '.join(columns)
+    conn.execute(f'''
+        CREATE TABLE {table} (
+            {bucket} {bucket_type} NOT NULL,
+            {', '.join(f"{d} TEXT NOT NULL" for d in columns)},
+            reviewed INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY ({bucket}, {dims}, reviewed)
+        ) WITHOUT ROWID
+    ''')
+
+    def key(row):
+        return ', '.join(
+            [bucket_sql.format(row=f"{row}.")]
+            + [f"COALESCE({row}.{d}, '')" for d in columns]
+            + [reviewed_sql(f"{row}.")]
+        )
+
+    def match(row):
+        return ' AND '.join(
+            [f"{bucket} = {bucket_sql.format(row=f'{row}.')}"]
+            + [f"{d} = COALESCE({row}.{d}, '')" for d in columns]
+            + [f"reviewed = {reviewed_sql(f'{row}.')}"]
+        )
+
+    add = f'''
+        INSERT INTO {table} ({bucket}, {dims}, reviewed, count) VALUES ({key('new')}, 1)
+        ON CONFLICT ({bucket}, {dims}, reviewed) DO UPDATE SET count = count + 1;
+    '''
+    remove = f"UPDATE {table} SET count = count - 1 WHERE {match('old')};"
+    # Separate statements: executescript() would commit the migration half-done
+    conn.execute(f"CREATE TRIGGER {trigger}_insert AFTER INSERT ON logs BEGIN {add} END")
+    conn.execute(f'''
+        CREATE TRIGGER {trigger}_update
+            AFTER UPDATE OF timestamp, {dims}, last_updated_at ON logs
+            BEGIN {remove} {add} END
+    ''')
+    conn.execute(f"CREATE TRIGGER {trigger}_delete AFTER DELETE ON logs BEGIN {remove} END")
+    rebuild_rollups(conn, columns, tables=(table,))
+    app.logger.info(f"Created metrics rollup table {table}.")
+
+def recreate_rollups(conn, table='metrics_daily'):
+    """Replace a rollup table and its triggers with ones over the current ROLLUP_DIMS."""
+    for event in ('insert', 'update', 'delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {ROLLUP_TABLES[table][3]}_{event}")
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    ensure_rollups(conn, table=table)
+
+def rebuild_rollups(conn, columns=ROLLUP_DIMS, tables=tuple(ROLLUP_TABLES)):
+    """Recompute the rollup tables from the logs table (caller commits)."""
+    dims = ', '.join(columns)
+    for table in tables:
+        bucket, _, bucket_sql, _ = ROLLUP_TABLES[table]
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f'''
+            INSERT INTO {table} ({bucket}, {dims}, reviewed, count)
+            SELECT {bucket_sql.format(row='')}, {', '.join(f"COALESCE({d}, '')" for d in columns)},
+                   {reviewed_sql()}, COUNT(*)
+              FROM logs GROUP BY 1, {', '.join(str(i) for i in range(2, len(columns) + 3))}
+        ''')
+
+def calculate_review_counts(daily):
+    rc = defaultdict(int)
+    for counts in daily.values():
+        for key, val in counts.items():
+            rc[key] += val
+    rc["not_reviewed"] = rc["total"] - rc["reviewed"]
+    return rc
+
+METRIC_KEYS = ['total', 'reviewed', 'not_reviewed'] + [key for key, _, _ in REVIEW_COUNT_FIELDS]
+REVIEW_STATE_COLUMNS = ('is_independent_question', 'response_review', 'query_review',
+                        'urls_review', 'last_updated_at')
+
+def metric_counts(rc):
+    """Every METRIC_KEYS count (zeros included) for the page's metrics summary."""
+    return {key: rc[key] for key in METRIC_KEYS}
+
+def row_metric_counts(row):
+    """What a single logs row adds to the METRIC_KEYS counts."""
+    reviewed = int(bool(is_reviewed(row)))
+    counts = {'total': 1, 'reviewed': reviewed, 'not_reviewed': 1 - reviewed}
+    for key, col, val in REVIEW_COUNT_FIELDS:
+        counts[key] = int(row.get(col) == val)
+    return counts
+
+def fetch_review_state(c, log_id, filters=None):
+    """(review columns of a row, whether it matches `filters`), or None if missing."""
+    where, params = filters.log_sql() if filters else ('1', [])
+    c.execute(
+        f"SELECT {', '.join(REVIEW_STATE_COLUMNS)}, ({where}) FROM logs WHERE id=?",
+        [*params, log_id]
+    )
+    row = c.fetchone()
+    if row is None:
+        return None
+    return dict(zip(REVIEW_STATE_COLUMNS, row)), bool(row[-1])
+
+def metric_delta(before, after):
+    """Change in the filtered metric counts between two fetch_review_state() results."""
+    delta = defaultdict(int)
+    for (row, matches), sign in ((before, -1), (after, 1)):
+        if matches:
+            for key, val in row_metric_counts(row).items():
+                delta[key] += sign * val
+    return {key: val for key, val in delta.items() if val}
+
+
+# --- Rendered response cache ---
+# bleach + markdown output depends only on the raw response and the sanitizer
+# config, so it is stored in rendered_responses under a hash of both. A config
+# change produces new keys; stale rows are dropped by the backfill command.
+RENDER_CACHE_SIZE = 2048
+RENDER_CONFIG_KEY = hashlib.sha256(json.dumps(
+    [ALLOWED_TAGS, ALLOWED_ATTRIBUTES, bleach.__version__, markdown.__version__],
+    sort_keys=True
+).encode()).hexdigest()[:16]
+
+render_lru = OrderedDict()
+render_lru_lock = threading.Lock()
+
+def ensure_render_cache(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rendered_responses (
+            hash TEXT PRIMARY KEY,
+            config TEXT NOT NULL,
+            html TEXT NOT NULL
+        )
+    ''')
+
+def render_response(response):
+    with render_stage_latency.time(stage='sanitize'):
+        html = bleach.clean(
+            response,
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            strip=True
+        )
+    with render_stage_latency.time(stage='markdown'):
+        return markdown.markdown(html)
+
+def response_cache_key(response):
+    return hashlib.sha256(f"{RENDER_CONFIG_KEY}\0{response}".encode()).hexdigest()
+
+def render_responses(conn, responses):
+    """Return {raw response: sanitized HTML}, rendering only cache misses."""
+    keys = {response: response_cache_key(response) for response in responses}
+    rendered = {}
+    with render_lru_lock:
+        for response, key in keys.items():
+            if key in render_lru:
+                render_lru.move_to_end(key)
+                rendered[response] = render_lru[key]
+
+    missing = {key: response for response, key in keys.items() if response not in rendered}
+    if missing:
+        rows = conn.execute(
+            f"SELECT hash, html FROM rendered_responses WHERE hash IN ({','.join('?' for _ in missing)})",
+            list(missing)
+        ).fetchall()
+        stored = {key: html for key, html in rows}
+        new_rows = []
+        for key, response in missing.items():
+            if key not in stored:
+                stored[key] = render_response(response)
+                new_rows.append((key, RENDER_CONFIG_KEY, stored[key]))
+            rendered[response] = stored[key]
+        if new_rows:
+            # `conn` may be read-only; the cache is written separately
+            writer = get_db()
+            try:
+                writer.executemany("INSERT OR IGNORE INTO rendered_responses VALUES (?, ?, ?)", new_rows)
+                writer.commit()
+            except sqlite3.Error as e:
+                # The cache is an optimization; a locked database must not fail the page
+                writer.rollback()
+                app.logger.warning(f"Could not store rendered responses: {e}")
+        with render_lru_lock:
+            for key in missing:
+                render_lru[key] = stored[key]
+            while len(render_lru) > RENDER_CACHE_SIZE:
+                render_lru.popitem(last=False)
+    return rendered
+
+def backfill_rendered_responses(batch_size=500):
+    """Render every stored response not yet in the cache; drop stale entries."""
+    with get_db() as conn:
+        stale = conn.execute(
+            "DELETE FROM rendered_responses WHERE config<>?", (RENDER_CONFIG_KEY,)
+        ).rowcount
+        conn.commit()
+        rendered = 0
+        reader = conn.cursor()
+        reader.execute("SELECT DISTINCT response FROM logs WHERE response<>''")
+        while True:
+            batch = [row[0] for row in reader.fetchmany(batch_size)]
+            if not batch:
+                break
+            keys = {response_cache_key(r): r for r in batch}
+            have = {row[0] for row in conn.execute(
+                f"SELECT hash FROM rendered_responses WHERE hash IN ({','.join('?' for _ in keys)})",
+                list(keys)
+            )}
+            new_rows = [(k, RENDER_CONFIG_KEY, render_response(r)) for k, r in keys.items() if k not in have]
+            conn.executemany("INSERT OR IGNORE INTO rendered_responses VALUES (?, ?, ?)", new_rows)
+            conn.commit()
+            rendered += len(new_rows)
+    app.logger.info(f"Rendered {rendered} responses; removed {stale} stale cache entries.")
+    return rendered, stale
+
+# --- Pagination ---
+# Keyset pagination on (timestamp, id): each page starts from the row beyond
+# the previous one, so the cost does not grow with the page number.
+def format_cursor(log):
+    return f"{log['timestamp']}|{log['id']}"
+
+def parse_cursor(value):
+    try:
+        ts, log_id = value.rsplit('|', 1)
+        return ts, int(log_id)
+    except (AttributeError, ValueError):
+        return None
+
+def fetch_log_page(c, where, params, cursor, direction, per_page):
+    """Rows of one page, newest first, after/before the (timestamp, id) cursor."""
+    if cursor and direction == 'before':
+        c.execute(
+            f"SELECT * FROM logs WHERE {where} AND (timestamp, id) > (?, ?)"
+            " ORDER BY timestamp ASC, id ASC LIMIT ?",
+            [*params, *cursor, per_page]
+        )
+        return [dict(r) for r in reversed(c.fetchall())]
+    if cursor:
+        c.execute(
+            f"SELECT * FROM logs WHERE {where} AND (timestamp, id) < (?, ?)"
+            " ORDER BY timestamp DESC, id DESC LIMIT ?",
+            [*params, *cursor, per_page]
+        )
+    else:
+        c.execute(
+            f"SELECT * FROM logs WHERE {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            [*params, per_page]
+        )
+    return [dict(r) for r in c.fetchall()]
+
+def fetch_last_page(c, where, params, count):
+    c.execute(
+        f"SELECT * FROM logs WHERE {where} ORDER BY timestamp ASC, id ASC LIMIT ?",
+        [*params, count]
+    )
+    return [dict(r) for r in reversed(c.fetchall())]
+
+
+# --- Full-text search ---
+# logs_fts indexes query, response and notes; it stores no text of its own
+# (external content) and is kept in sync with logs by triggers.
+FTS_COLUMNS = ('query', 'response', 'notes')
+# Control characters cannot be typed into the search box, so escaping the
+# snippet text leaves them intact to be turned into <mark> afterwards
+MATCH_OPEN, MATCH_CLOSE = '\x02', '\x03'
+
+def ensure_fts(conn):
+    cols = ', '.join(FTS_COLUMNS)
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+            {cols}, content='logs', content_rowid='id', tokenize='porter unicode61'
+        )
+    ''')
+    new = ', '.join(f"new.{c}" for c in FTS_COLUMNS)
+    old = ', '.join(f"old.{c}" for c in FTS_COLUMNS)
+    add = f"INSERT INTO logs_fts (rowid, {cols}) VALUES (new.id, {new});"
+    remove = f"INSERT INTO logs_fts (logs_fts, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_fts_update AFTER UPDATE OF {cols} ON logs BEGIN {remove} {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs BEGIN {remove} END")
+    conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+
+def fts_match(search):
+    """Turn search box text into an FTS5 query: all words, `word*` as a prefix."""
+    terms = []
+    for word in search.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def fetch_search_page(c, filters, page, per_page):
+    """One page of matching rows, best match (bm25) first, with highlights.
+
+    CROSS JOIN keeps logs_fts as the outer loop: the match narrows the rows
+    far more than a date range, and bm25 needs every match anyway.
+    """
+    where, params = filters.log_sql(search=False)
+    c.execute(
+        f"""SELECT logs.*,
+                   highlight(logs_fts, 0, ?, ?) AS query_highlight,
+                   snippet(logs_fts, 1, ?, ?, '…', 24) AS response_snippet
+              FROM logs_fts CROSS JOIN logs ON logs.id = logs_fts.rowid
+             WHERE logs_fts MATCH ? AND {where}
+             ORDER BY bm25(logs_fts, 2.0, 1.0, 1.0), logs.timestamp DESC
+             LIMIT ? OFFSET ?""",
+        [MATCH_OPEN, MATCH_CLOSE, MATCH_OPEN, MATCH_CLOSE, filters.match,
+         *params, per_page, (page - 1) * per_page]
+    )
+    return [dict(r) for r in c.fetchall()]
+
+def highlight_markup(text):
+    return Markup(str(escape(text)).replace(MATCH_OPEN, '<mark>').replace(MATCH_CLOSE, '</mark>'))
+
+
+# --- Export ---
+# Exports stream straight from an SQLite cursor, EXPORT_BATCH_SIZE rows at a
+# time, through the CSV/NDJSON writer (and gzip), so memory use does not grow
+# with the size of the export and the download starts at once.
+EXPORT_BATCH_SIZE = 500
+EXPORT_COLUMNS = [
+    ('timestamp', 'Timestamp'),
+    ('query', 'Query'),
+    ('response', 'Response'),
+    ('tool', 'Tool'),
+    ('model', 'Model'),
+    ('tester', 'Tester'),
+    ('is_independent_question', 'Independent?'),
+    ('response_review', 'Response Review'),
+    ('query_review', 'Query Review'),
+    ('urls_review', 'URLs Review'),
+    ('notes', 'Notes'),
+    ('last_updated_by', 'Last Updated By'),
+    ('last_updated_at', 'Last Updated At'),
+]
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def iter_export_batches(filters, batch_size=EXPORT_BATCH_SIZE, progress=None):
+    """Yield lists of row tuples (EXPORT_COLUMNS order), newest first.
+
+    `progress(rows)` is called with the running row count before each batch.
+    """
+    where, params = filters.log_sql()
+    # Own connection: the export holds one read snapshot from start to end
+    conn = connect_db(readonly=True)
+    try:
+        cur = conn.execute(
+            f"SELECT {', '.join(col for col, _ in EXPORT_COLUMNS)} FROM logs"
+            f" WHERE {where} ORDER BY timestamp DESC, id DESC",
+            params
+        )
+        done = 0
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            done += len(rows)
+            if progress:
+                progress(done)
+            yield rows
+    finally:
+        conn.close()
+
+def iter_csv(batches):
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    yield buf.getvalue()
+    for rows in batches:
+        buf.seek(0); buf.truncate(0)
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+def iter_ndjson(batches):
+    cols = [col for col, _ in EXPORT_COLUMNS]
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(cols, row)), ensure_ascii=False) + '\n' for row in rows)
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for i, chunk in enumerate(chunks):
+        data = compressor.compress(chunk)
+        if i == 0:
+            # Send the first bytes now instead of when zlib's buffer fills
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(filters, file_type, compress=False, progress=None):
+    """Encoded chunks of the export of `filters` as csv or ndjson."""
+    batches = iter_export_batches(filters, progress=progress)
+    text = iter_csv(batches) if file_type == 'csv' else iter_ndjson(batches)
+    chunks = (chunk.encode('utf-8') for chunk in text)
+    return gzip_stream(chunks) if compress else chunks
+
+
+# --- Parquet snapshots ---
+# SNAPSHOT_DIR holds one hive-style partition per day (date=YYYY-MM-DD/) for
+# pandas/pyarrow. Low-cardinality columns are dictionary-encoded, and
+# _snapshot.json records each partition's row count and change counter (from
+# log_day_changes) so later runs only (re)write the days that are new or
+# changed, and delete those left without rows.
+SNAPSHOT_MANIFEST = '_snapshot.json'
+SNAPSHOT_ROW_GROUP = 50000
+SNAPSHOT_DICTIONARY_COLUMNS = {
+    'tool', 'model', 'tester', 'is_independent_question', 'response_review',
+    'query_review', 'urls_review', 'last_updated_by',
+}
+snapshot_lock = threading.Lock()
+
+def snapshot_schema():
+    fields = [pa.field('id', pa.int64()), pa.field('timestamp', pa.timestamp('ms'))]
+    for col, _ in EXPORT_COLUMNS:
+        if col == 'timestamp':
+            continue
+        if col in SNAPSHOT_DICTIONARY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+def load_snapshot_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'data_version': None, 'columns': None, 'partitions': {}}
+
+def save_snapshot_manifest(snapshot_dir, manifest):
+    path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+def ensure_day_changes(conn):
+    """Per-day counter bumped by triggers on every insert, update or delete of a log."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS log_day_changes (
+            day TEXT PRIMARY KEY,
+            changes INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    def bump(row):
+        return (f"INSERT INTO log_day_changes (day, changes) VALUES (substr({row}.timestamp, 1, 10), 1) "
+                f"ON CONFLICT (day) DO UPDATE SET changes = changes + 1;")
+
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_day_changes_insert AFTER INSERT ON logs "
+                 f"BEGIN {bump('new')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_day_changes_update AFTER UPDATE ON logs "
+                 f"BEGIN {bump('old')} {bump('new')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS logs_day_changes_delete AFTER DELETE ON logs "
+                 f"BEGIN {bump('old')} END")
+    conn.execute('''
+        INSERT OR IGNORE INTO log_day_changes (day, changes)
+        SELECT substr(timestamp, 1, 10), 1 FROM logs GROUP BY 1
+    ''')
+
+def snapshot_day_stats(conn):
+    """{day: [rows, change counter]} for every day with logs."""
+    changes = dict(conn.execute("SELECT day, changes FROM log_day_changes"))
+    rows = conn.execute("SELECT day, SUM(count) FROM metrics_daily GROUP BY day")
+    return {day: [n, changes.get(day, 0)] for day, n in rows if n}
+
+def write_snapshot_partition(conn, snapshot_dir, day, schema):
+    """Write one day's rows to date=<day>/part-0.parquet, replacing it atomically."""
+    part_dir = os.path.join(snapshot_dir, f'date={day}')
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, 'part-0.parquet')
+    tmp = path + '.tmp'
+    cols = [col for col, _ in EXPORT_COLUMNS if col != 'timestamp']
+    cur = conn.execute(
+        f"SELECT id, replace(timestamp, ',', '.'), {', '.join(cols)} FROM logs"
+        f" WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, id",
+        (day, f'{day}\x7f')
+    )
+    names = ['id', 'timestamp'] + cols
+    with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+        while True:
+            rows = cur.fetchmany(SNAPSHOT_ROW_GROUP)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array(values, type=pa.string()).cast(field.type)
+                if name == 'timestamp' or name in SNAPSHOT_DICTIONARY_COLUMNS
+                else pa.array(values, type=field.type)
+                for name, values, field in zip(names, columns, schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    os.replace(tmp, path)
+
+def write_snapshot(snapshot_dir=SNAPSHOT_DIR, progress=None):
+    """Bring the Parquet snapshot up to date; returns counts of partitions written.
+
+    `progress(percent, rows)` is called after each partition.
+    """
+    if pq is None:
+        raise RuntimeError(SNAPSHOT_MISSING_PYARROW)
+    with snapshot_lock:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        manifest = load_snapshot_manifest(snapshot_dir)
+        # One read snapshot for the stats and every partition written from them
+        conn = connect_db(readonly=True)
+        try:
+            conn.execute("BEGIN")
+            version = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+            schema = snapshot_schema()
+            if manifest.get('columns') != schema.names:
+                # New columns: every partition must be rewritten to match
+                manifest.update(data_version=None, columns=schema.names, partitions={})
+            if version == manifest['data_version']:
+                return {'written': 0, 'deleted': 0, 'unchanged': len(manifest['partitions'])}
+            stats = snapshot_day_stats(conn)
+            old = manifest['partitions']
+            stale = sorted(day for day, stat in stats.items() if old.get(day) != stat)
+            # Days whose rows were all deleted
+            emptied = sorted(set(old) - set(stats))
+            for day in emptied:
+                shutil.rmtree(os.path.join(snapshot_dir, f'date={day}'), ignore_errors=True)
+                del old[day]
+                save_snapshot_manifest(snapshot_dir, manifest)
+            rows = 0
+            for i, day in enumerate(stale, 1):
+                write_snapshot_partition(conn, snapshot_dir, day, schema)
+                # Record progress so an interrupted run resumes where it stopped
+                old[day] = stats[day]
+                save_snapshot_manifest(snapshot_dir, manifest)
+                rows += stats[day][0]
+                if progress:
+                    progress(i * 100 / len(stale), rows)
+            manifest.update(data_version=version, partitions=stats)
+            save_snapshot_manifest(snapshot_dir, manifest)
+        finally:
+            conn.close()
+    app.logger.info(f"Snapshot to {snapshot_dir}: wrote {len(stale)} partitions, deleted {len(emptied)}.")
+    return {'written': len(stale), 'deleted': len(emptied), 'unchanged': len(stats) - len(stale)}
+
+
+# --- Conditional requests ---
+# data_version counts changes to the logs: every ingest batch that inserted
+# rows and every review save bump it in the same transaction. Page and JSON
+# responses carry an ETag derived from it and from the request, so a reload
+# with unchanged data and filters is answered 304 after one row lookup.
+FILTER_ARGS = ('start_date', 'end_date', 'tool', 'model', 'independent', 'response_review',
+               'query_review', 'urls_review', 'review_status', 'search')
+# Responses also change with the code and templates that produce them
+CODE_VERSION = hashlib.sha256(repr([
+    os.stat(path).st_mtime_ns
+    for path in [__file__, *Path(app.root_path, app.template_folder).glob('*.html')]
+]).encode()).hexdigest()[:16]
+
+def ensure_data_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+# Caller commits
+def bump_data_version(conn):
+    conn.execute("UPDATE data_version SET version = version + 1")
 
-def get_paginated_logs(logs, page, per_page):
-    start = (page - 1) * per_page
-    return logs[start:start + per_page]
+def data_version():
+    return get_db(readonly=True).execute("SELECT version FROM data_version").fetchone()[0]
 
+def request_etag():
+    today = datetime.now().strftime('%Y-%m-%d')
+    other_args = sorted((k, v) for k, v in request.args.items(multi=True) if k not in FILTER_ARGS)
+    key = (
+        request.endpoint, CODE_VERSION, data_version(),
+        LogFilter.from_args(request.args, today, today), other_args,
+        session.get('user_id'), session.get('read_only', False)
+    )
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+
+def conditional(view):
+    """Answer 304 Not Modified, before running the view, if the ETag matches."""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        etag = request_etag()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Per user, and always revalidated
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+
+# --- Review updates ---
+REVIEW_OPTIONS = {
+    'is_independent_question': ["Yes", "No"],
+    'response_review': ["Excellent", "Good", "Satisfactory", "Unsatisfactory"],
+    'query_review': ["Good", "Acceptable", "Bad", "I Don't Know"],
+    'urls_review': ["Good", "Acceptable", "Bad", "I Don't Know"],
+}
+REVIEW_BATCH_LIMIT = 500
+
+def review_values(values):
+    """Apply the rating defaults to {column: value}; ValueError on an unknown value.
+
+    Independent=No clears the ratings; anything else means Yes, with the
+    ratings defaulting to Excellent/Good/Good.
+    """
+    new = {col: values.get(col) or '' for col in REVIEW_OPTIONS}
+    for col, options in REVIEW_OPTIONS.items():
+        if new[col] and new[col] not in options:
+            raise ValueError(f"Invalid {col}: {new[col]!r}")
+    if new['is_independent_question'] == 'No':
+        new.update(response_review='', query_review='', urls_review='')
+    else:
+        new['is_independent_question'] = 'Yes'
+        if not new['response_review']: new['response_review'] = 'Excellent'
+        if not new['query_review']:    new['query_review']    = 'Good'
+        if not new['urls_review']:     new['urls_review']     = 'Good'
+    return new
+
+def save_review(cur, log_id, fields, reviewer, ts, filters=None):
+    """Update one row inside the caller's transaction.
+
+    `fields` overrides the row's current review values (notes=None keeps the
+    notes). Returns (before, after, new values) or None if the row is missing;
+    before/after are fetch_review_state() results for metric_delta().
+    """
+    before = fetch_review_state(cur, log_id, filters)
+    if before is None:
+        return None
+    new = review_values({**before[0], **fields})
+    cur.execute("""
+        UPDATE logs
+           SET is_independent_question=?,
+               response_review=?,
+               query_review=?,
+               urls_review=?,
+               notes=COALESCE(?, notes),
+               last_updated_by=?,
+               last_updated_at=?
+         WHERE id=?
+    """, (
+        new['is_independent_question'],
+        new['response_review'],
+        new['query_review'],
+        new['urls_review'],
+        fields.get('notes'),
+        reviewer,
+        ts,
+        log_id
+    ))
+    return before, fetch_review_state(cur, log_id, filters), new
+
+def review_change_message(log_id, before, new):
+    changed = [
+        name for name, col in (('independent', 'is_independent_question'), ('response', 'response_review'),
+                               ('query', 'query_review'), ('urls', 'urls_review'))
+        if before[0][col] != new[col]
+    ]
+    return f"Record {log_id} updated: fields changed = {', '.join(changed) or 'none'}"
+
+
+# --- Background jobs ---
+# Ingestion, rebuilds and exports run as jobs on a small thread pool instead
+# of inside the request. Each job is a row in the jobs table, so any process
+# can poll or cancel it. Submitting a job while an identical one (same kind
+# and parameters) is queued or running returns that one instead.
+JOB_STATUSES_ACTIVE = ('queued', 'running')
+# Seconds between progress writes, and between heartbeats of a process's jobs
+JOB_PROGRESS_INTERVAL = 1.0
+JOB_HEARTBEAT_SECONDS = 10
+# Active jobs without a heartbeat for this long belonged to a process that died
+JOB_STALE_SECONDS = 60
+JOB_RETENTION_DAYS = 30
+# Finished exports are deleted after this many hours
+EXPORT_RETENTION_HOURS = 24
+
+class JobCancelled(BaseException):
+    """Raised from JobContext.progress() once a cancel is requested.
+
+    A BaseException, like KeyboardInterrupt, so that error handling which
+    skips a bad log file does not swallow it.
+    """
+
+def ensure_jobs_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            job_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_by TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            updated_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_key ON jobs (status, job_key)")
+
+def now_str():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+class JobContext:
+    """Handed to a job function to report progress and notice cancellation."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.last_write = 0.0
+
+    def progress(self, percent, processed=0):
+        """Record progress (throttled); raises JobCancelled if a cancel was requested.
+
+        May run inside the job's own write transaction (an ingest batch), in
+        which case the update commits or rolls back with it.
+        """
+        if time.monotonic() - self.last_write < JOB_PROGRESS_INTERVAL:
+            return
+        self.last_write = time.monotonic()
+        conn = get_db()
+        in_transaction = conn.in_transaction
+        conn.execute(
+            "UPDATE jobs SET progress=?, processed=?, updated_at=? WHERE id=?",
+            (round(min(percent, 100), 1), processed, now_str(), self.id)
+        )
+        cancel = conn.execute("SELECT cancel_requested FROM jobs WHERE id=?", (self.id,)).fetchone()[0]
+        if not in_transaction:
+            conn.commit()
+        if cancel:
+            raise JobCancelled()
+
+def job_dict(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    del job['job_key']
+    return job
+
+def fetch_job(conn, job_id):
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    row = cur.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    return job_dict(row) if row else None
+
+def expire_stale_jobs(conn):
+    """Fail active jobs whose process stopped sending heartbeats (caller commits)."""
+    cutoff = (datetime.now() - timedelta(seconds=JOB_STALE_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute(
+        f"UPDATE jobs SET status='failed', error='Interrupted: the process running it stopped.', "
+        f"finished_at=? WHERE status IN {JOB_STATUSES_ACTIVE} AND updated_at < ?",
+        (now_str(), cutoff)
+    )
+    old = (datetime.now() - timedelta(days=JOB_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute(f"DELETE FROM jobs WHERE status NOT IN {JOB_STATUSES_ACTIVE} AND finished_at < ?", (old,))
+
+job_pool = None
+job_pool_lock = threading.Lock()
+# Ids of the jobs queued or running in this process, for the heartbeat
+local_jobs = set()
+
+def job_executor():
+    global job_pool
+    with job_pool_lock:
+        if job_pool is None:
+            job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+            threading.Thread(target=job_heartbeat, name='job-heartbeat', daemon=True).start()
+        return job_pool
+
+def job_heartbeat():
+    """Keep this process's active jobs fresh, and fail other processes' stale ones."""
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        with job_pool_lock:
+            ids = list(local_jobs)
+        conn = get_db()
+        try:
+            with write_transaction(conn):
+                if ids:
+                    conn.execute(
+                        f"UPDATE jobs SET updated_at=? WHERE id IN ({','.join('?' for _ in ids)})",
+                        [now_str(), *ids]
+                    )
+                expire_stale_jobs(conn)
+        except sqlite3.Error as e:
+            app.logger.warning(f"Job heartbeat failed: {e}")
+
+def submit_job(kind, params=None, user=None):
+    """Queue a job; returns (job, created). An identical active job is reused."""
+    params = params or {}
+    # Only the user who started an export may download it, so they are not shared
+    key = json.dumps([kind, params, user if kind in PER_USER_JOB_KINDS else None], sort_keys=True)
+    conn = get_db()
+    with write_transaction(conn):
+        expire_stale_jobs(conn)
+        row = conn.execute(
+            f"SELECT id FROM jobs WHERE status IN {JOB_STATUSES_ACTIVE} AND job_key=?", (key,)
+        ).fetchone()
+        if row:
+            return fetch_job(conn, row[0]), False
+        ts = now_str()
+        job_id = conn.execute(
+            "INSERT INTO jobs (kind, params, job_key, status, created_by, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (kind, json.dumps(params), key, user, ts, ts)
+        ).lastrowid
+    with job_pool_lock:
+        local_jobs.add(job_id)
+    job_executor().submit(run_job, job_id, kind, params)
+    app.logger.info(f"Queued {kind} job {job_id} {params}")
+    return fetch_job(conn, job_id), True
+
+def finish_job(job_id, status, result=None, error=None):
+    conn = get_db()
+    if conn.in_transaction:
+        conn.rollback()
+    ts = now_str()
+    conn.execute(
+        "UPDATE jobs SET status=?, result=?, error=?, updated_at=?, finished_at=?"
+        + (", progress=100" if status == 'succeeded' else "") + " WHERE id=?",
+        (status, json.dumps(result) if result is not None else None, error, ts, ts, job_id)
+    )
+    conn.commit()
+
+def run_job(job_id, kind, params):
+    try:
+        conn = get_db()
+        with write_transaction(conn):
+            # Not if it was cancelled (or expired) while queued
+            started = conn.execute(
+                "UPDATE jobs SET status='running', started_at=?, updated_at=? WHERE id=? AND status='queued'",
+                (now_str(), now_str(), job_id)
+            ).rowcount
+        if not started:
+            return
+        app.logger.info(f"Started {kind} job {job_id}")
+        try:
+            result = JOB_KINDS[kind](JobContext(job_id), **params)
+        except JobCancelled:
+            finish_job(job_id, 'cancelled')
+            app.logger.info(f"Cancelled {kind} job {job_id}")
+        except Exception as e:
+            app.logger.error(f"{kind} job {job_id} failed: {e}", exc_info=True)
+            finish_job(job_id, 'failed', error=str(e))
+        else:
+            finish_job(job_id, 'succeeded', result=result)
+            app.logger.info(f"Finished {kind} job {job_id}: {result}")
+    finally:
+        with job_pool_lock:
+            local_jobs.discard(job_id)
+
+def cancel_job(job_id):
+    """Request a cancel; a queued job is cancelled at once. Returns the job or None."""
+    conn = get_db()
+    with write_transaction(conn):
+        conn.execute(
+            f"UPDATE jobs SET cancel_requested=1 WHERE id=? AND status IN {JOB_STATUSES_ACTIVE}", (job_id,)
+        )
+        conn.execute(
+            "UPDATE jobs SET status='cancelled', finished_at=?, updated_at=? WHERE id=? AND status='queued'",
+            (now_str(), now_str(), job_id)
+        )
+    return fetch_job(conn, job_id)
+
+def ingest_job(job):
+    return ingest_new_entries(progress=job.progress)
+
+def backfill_models_job(job):
+    return {'updated': backfill_models(progress=job.progress)}
+
+def rebuild_rollups_job(job):
+    # One write transaction: its progress would only show once it commits, and a
+    # cancel could not be recorded until then, so it reports none and runs to the end
+    conn = get_db()
+    with write_transaction(conn):
+        rebuild_rollups(conn)
+        # Cached graphs and ETags are keyed by the data version
+        bump_data_version(conn)
+    return {}
+
+def prune_exports():
+    cutoff = time.time() - EXPORT_RETENTION_HOURS * 3600
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+def export_job(job, filters, file_type, compress):
+    """Write the export of `filters` (a query string) to EXPORT_DIR."""
+    filters = LogFilter.from_args(MultiDict(parse_qsl(filters)), '0000-01-01', '9999-12-31')
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    where, params = filters.log_sql()
+    total = get_db(readonly=True).execute(f"SELECT COUNT(*) FROM logs WHERE {where}", params).fetchone()[0]
+    download_name = f"logs_{datetime.now():%Y%m%d_%H%M%S}.{file_type}" + ('.gz' if compress else '')
+    path = os.path.join(EXPORT_DIR, f"job{job.id}_{download_name}")
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in export_stream(filters, file_type, compress,
+                                       progress=lambda done: job.progress(done * 100 / max(total, 1), done)):
+                f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {'rows': total, 'file': os.path.basename(path), 'download_name': download_name,
+            'bytes': os.path.getsize(path)}
+
+def snapshot_job(job):
+    return write_snapshot(progress=job.progress)
+
+JOB_KINDS = {
+    'ingest': ingest_job,
+    'backfill_models': backfill_models_job,
+    'rebuild_rollups': rebuild_rollups_job,
+    'export': export_job,
+    'snapshot': snapshot_job,
+}
+# The kinds read-only users may start; the others write to the database
+READ_ONLY_JOB_KINDS = {'export'}
+# Kinds whose identical jobs are only shared by the user who started them
+PER_USER_JOB_KINDS = {'export'}
+
+
+# --- Schema migrations ---
+# Applied in order by migrate(); a version is recorded in schema_version in the
+# same transaction as its changes. Append new steps, never renumber old ones.
+def create_filter_indexes(conn):
+    # The home page walks idx_logs_timestamp newest first; when a filter is
+    # selective these let SQLite jump to its rows within the date range instead
+    for col in ('tool', 'is_independent_question', 'response_review', 'query_review', 'urls_review'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_logs_{col}_timestamp ON logs ({col}, timestamp)")
+    # Statistics for the planner to choose between them
+    conn.execute("ANALYZE logs")
+
+MIGRATIONS = [
+    (1, "create logs table", create_logs_table),
+    (2, "add notes column", add_notes_column),
+    (3, "unique index on (timestamp, query)", ensure_logs_unique_index),
+    (4, "file offsets table", ensure_offsets_table),
+    (5, "timestamp and metrics indexes", create_log_indexes),
+    # The rollup dimensions before migration 12 added model
+    (6, "daily metrics rollups", lambda conn: ensure_rollups(
+        conn, ('tool', 'is_independent_question', 'response_review', 'query_review', 'urls_review'))),
+    (7, "rendered response cache", ensure_render_cache),
+    (8, "filter indexes", create_filter_indexes),
+    (9, "full-text search index", ensure_fts),
+    (10, "data version counter", ensure_data_version),
+    (11, "model column", add_model_column),
+    (12, "model in metrics rollups", recreate_rollups),
+    (13, "jobs table", ensure_jobs_table),
+    (14, "calendar table", create_calendar),
+    (15, "hourly metrics rollups", lambda conn: ensure_rollups(conn, table='metrics_hourly')),
+    (16, "per-day change counters", ensure_day_changes),
+]
+# Existing rows get their model from backfill_models() once this is applied
+MODEL_COLUMN_MIGRATION = 11
+
+def migrate(conn):
+    """Apply pending MIGRATIONS; returns the versions applied."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    done = {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        # Re-check under the write lock: of several processes starting at
+        # once, only one applies each step
+        with write_transaction(conn):
+            if not conn.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone():
+                apply(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                applied.append(version)
+                app.logger.info(f"Applied migration {version}: {description}")
+    return applied
+
+
+# --- Instrumentation ---
+# Per-process metrics, served in the Prometheus text format by /metrics.
+# SQL statements are timed by InstrumentedConnection (see connect_db).
+request_latency = Histogram(
+    'qa_http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status')
+)
+render_stage_latency = Histogram(
+    'qa_render_stage_duration_seconds', 'Time spent in each stage of building a page', ('stage',)
+)
+ingest_records = Counter('qa_ingest_records_total', 'Log entries read by ingestion, by outcome', ('result',))
+ingest_bytes = Counter('qa_ingest_bytes_total', 'Log bytes read by ingestion')
+ingest_seconds = Counter('qa_ingest_seconds_total', 'Time spent in ingestion runs')
+ingest_last_rate = Gauge('qa_ingest_last_run_rate', 'Throughput of the last ingestion run', ('unit',))
+
+def record_ingest(counts, elapsed):
+    ingest_records.inc(counts['inserted'], result='inserted')
+    ingest_records.inc(counts['skipped'], result='skipped')
+    ingest_bytes.inc(counts['bytes'])
+    ingest_seconds.inc(elapsed)
+    if elapsed > 0:
+        ingest_last_rate.set((counts['inserted'] + counts['skipped']) / elapsed, unit='records_per_second')
+        ingest_last_rate.set(counts['bytes'] / elapsed, unit='bytes_per_second')
+
+@app.before_request
+def prepare_db():
+    ensure_db()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_request_sql()
+
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    sql = finish_request_sql()
+    # The rule, not the path, so that unknown URLs do not each get a series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_latency.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        log_slow_request(response, elapsed, sql)
+    return response
+
+def log_slow_request(response, elapsed, sql):
+    """One line per slow request, with its normalized filter and SQL time."""
+    filters = g.get('filters')
+    line = (f"{elapsed * 1000:.0f} ms {request.method} {request.path} {response.status_code} "
+            f"user={session.get('user_id', '-')} filter={filters.query_string() if filters else '-'}")
+    if sql:
+        line += f" sql={sql['seconds'] * 1000:.0f} ms in {sql['calls']} statements"
+        if sql['by_statement']:
+            statement, seconds = max(sql['by_statement'].items(), key=itemgetter(1))
+            line += f" slowest={seconds * 1000:.0f} ms: {statement}"
+    slow_request_logger.info(line)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape target; needs a login session or the METRICS_TOKEN bearer token."""
+    authorization = request.headers.get('Authorization', '').encode()
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}".encode())
+    if 'user_id' not in session and not token_ok:
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 # --- Routes ---
 @app.route('/', methods=['GET'])
 @login_required
+@conditional
 def home_route():
     # if 'user' not in session:
     #     flash('You must be logged in.', 'danger')
     #     return redirect(url_for('login'))
     
     today = datetime.now().strftime('%Y-%m-%d')
-    start_date = request.args.get('start_date', today)
-    end_date = request.args.get('end_date', today)
-    view_by = request.args.get('view_by', 'daily')
+    view_by, tz = graph_options(request.args)
     page = int(request.args.get('page', 1))
+    filters = g.filters = LogFilter.from_args(request.args, today, today)
+    searching = bool(filters.match)
 
-    # existing filters
-    selected_tool = request.args.get('tool', 'All')
-    selected_independent = request.args.get('independent', 'All')
-    selected_response_review = request.args.getlist('response_review')
-    selected_query_review = request.args.getlist('query_review')
-    selected_urls_review = request.args.getlist('urls_review')
-    selected_review_status = request.args.get('review_status', 'All')
+    with get_db(readonly=True) as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        where, params = filters.log_sql()
+        c.execute(f"SELECT COUNT(*) FROM logs WHERE {where}", params)
+        total_logs = c.fetchone()[0]
+        total_pages = (total_logs + PER_PAGE - 1) // PER_PAGE
+
+        cursor = request.args.get('after') or request.args.get('before')
+        direction = 'after' if request.args.get('after') else 'before' if cursor else None
+        if searching:
+            # Ranked by relevance rather than time, so paged by offset
+            page = max(1, min(total_pages if request.args.get('last') else page, total_pages))
+            paginated_logs = fetch_search_page(c, filters, page, PER_PAGE)
+        elif request.args.get('last') and total_pages > 1:
+            page = total_pages
+            paginated_logs = fetch_last_page(c, where, params, total_logs - (total_pages - 1) * PER_PAGE)
+        else:
+            paginated_logs = fetch_log_page(c, where, params, parse_cursor(cursor), direction, PER_PAGE)
+            if page <= 1 or (direction == 'before' and len(paginated_logs) < PER_PAGE):
+                page = 1
+                paginated_logs = fetch_log_page(c, where, params, None, None, PER_PAGE)
 
-    init_db()
-    ensure_notes_column()
+        daily = query_filter_counts(c, filters)
+        with render_stage_latency.time(stage='counts'):
+            mets = graph_metrics(c, filters, view_by, tz, daily)
+            rc = calculate_review_counts(daily)
+        models = list_models(c)
 
-    with sqlite3.connect(DB_FILE) as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        sql = "SELECT * FROM logs WHERE timestamp BETWEEN ? AND ?"
-        params = [f"{start_date} 00:00:00,000", f"{end_date} 23:59:59,999"]
-
-        if selected_tool != 'All':
-            sql += " AND tool=?"
-            params.append(selected_tool)
-        if selected_independent != "All":
-            sql += " AND is_independent_question=?"
-            params.append(selected_independent)
-        if selected_response_review:
-            sql += " AND response_review IN ({})".format(','.join('?' for _ in selected_response_review))
-            params.extend(selected_response_review)
-        if selected_query_review:
-            sql += " AND query_review IN ({})".format(','.join('?' for _ in selected_query_review))
-            params.extend(selected_query_review)
-        if selected_urls_review:
-            sql += " AND urls_review IN ({})".format(','.join('?' for _ in selected_urls_review))
-            params.extend(selected_urls_review)
-        if selected_review_status == "Reviewed":
-            sql += " AND (" + " OR ".join([
-                "is_independent_question<>''",
-                "response_review<>''",
-                "query_review<>''",
-                "urls_review<>''",
-                "last_updated_at IS NOT NULL"
-            ]) + ")"
-        elif selected_review_status == "Not Reviewed":
-            sql += " AND (" + " AND ".join([
-                "is_independent_question='' ",
-                "response_review='' ",
-                "query_review='' ",
-                "urls_review='' ",
-                "last_updated_at IS NULL"
-            ]) + ")"
-
-        sql += " ORDER BY timestamp DESC"
-        c.execute(sql, params)
-        all_entries = [dict(r) for r in c.fetchall()]
-
-    total_logs = len(all_entries)
-    paginated_logs = get_paginated_logs(all_entries, page, PER_PAGE)
-    total_pages = (total_logs + PER_PAGE - 1) // PER_PAGE
-    next_page = page + 1 if page < total_pages else None
-    prev_page = page - 1 if page > 1 else None
+        rendered = render_responses(conn, [log['response'] for log in paginated_logs if log.get('response')])
+
+    next_cursor = format_cursor(paginated_logs[-1]) if paginated_logs and page < total_pages else None
+    prev_cursor = format_cursor(paginated_logs[0]) if paginated_logs and page > 1 else None
 
     # Sanitize & clean
     for log in paginated_logs:
         if not log.get('query', '').strip():
             log['query'] = "(No Query Provided)"
+        elif log.get('query_highlight'):
+            log['query'] = highlight_markup(log['query_highlight'])
         else:
             log['query'] = escape(log['query'])
         if log.get('response'):
-            log['response'] = bleach.clean(
-                log['response'],
-                tags=ALLOWED_TAGS,
-                attributes=ALLOWED_ATTRIBUTES,
-                strip=True
-            )
-            log['response'] = markdown.markdown(log['response'])
+            log['response'] = rendered[log['response']]
         else:
             log['response'] = "(No Response Provided)"
-
-    mets = calculate_metrics(all_entries, view_by)
-    rc = calculate_review_counts(all_entries)
-
-    total = rc["total"]
-    reviewed = rc["reviewed"]
-    not_rev = rc["not_reviewed"]
-    p_rev = pct(reviewed, total)
-    p_not_rev = pct(not_rev, total)
-
-    indep_yes = rc["indep_yes"]
-    indep_no = rc["indep_no"]
-    yn_sum = indep_yes + indep_no
-    yes_pct = pct(indep_yes, yn_sum)
-    no_pct = pct(indep_no, yn_sum)
-
-    r_excel = rc["resp_excellent"]
-    r_good = rc["resp_good"]
-    r_sat = rc["resp_satisfactory"]
-    r_unsat = rc["resp_unsatisfactory"]
-    sum_resp = r_excel + r_good + r_sat + r_unsat
-
-    q_good = rc["query_good"]
-    q_acc = rc["query_acceptable"]
-    q_bad = rc["query_bad"]
-    q_idk = rc["query_idk"]
-    sum_q = q_good + q_acc + q_bad + q_idk
-
-    u_good = rc["urls_good"]
-    u_acc = rc["urls_acceptable"]
-    u_bad = rc["urls_bad"]
-    u_idk = rc["urls_idk"]
-    sum_u = u_good + u_acc + u_bad + u_idk
-
-    metrics_summary = {
-        'overall': f"Total Queries: {total} (100%), Reviewed: {reviewed} ({p_rev}%), Not Reviewed: {not_rev} ({p_not_rev}%)",
-        'independent': f"Is this an independent question for the QA tool? Yes: {indep_yes} ({yes_pct}%), No: {indep_no} ({no_pct}%)",
-        'response': (
-            f"Response Review (Reviewed + Independent=Yes): "
-            f"Excellent: {r_excel} ({pct(r_excel,sum_resp)}%), "
-            f"Good: {r_good} ({pct(r_good,sum_resp)}%), "
-            f"Satisfactory: {r_sat} ({pct(r_sat,sum_resp)}%), "
-            f"Unsatisfactory: {r_unsat} ({pct(r_unsat,sum_resp)}%)"
-        ),
-        'query': (
-            f"Query Review (Reviewed + Independent=Yes): "
-            f"Good: {q_good} ({pct(q_good,sum_q)}%), "
-            f"Acceptable: {q_acc} ({pct(q_acc,sum_q)}%), "
-            f"Bad: {q_bad} ({pct(q_bad,sum_q)}%), "
-            f"I Don't Know: {q_idk} ({pct(q_idk,sum_q)}%)"
-        ),
-        'urls': (
-            f"URLs in Response Review (Reviewed + Independent=Yes): "
-            f"Good: {u_good} ({pct(u_good,sum_u)}%), "
-            f"Acceptable: {u_acc} ({pct(u_acc,sum_u)}%), "
-            f"Bad: {u_bad} ({pct(u_bad,sum_u)}%), "
-            f"I Don't Know: {u_idk} ({pct(u_idk,sum_u)}%)"
+        if log.get('response_snippet'):
+            log['snippet'] = highlight_markup(log['response_snippet'])
+
+    with render_stage_latency.time(stage='graph'):
+        graph = generate_graph(mets)
+        model_graph = cached_model_graph(filters, data_version())['figure']
+
+    param_str = f"&{filters.query_string()}&{urlencode({'view_by': view_by, 'tz': tz})}"
+
+    with render_stage_latency.time(stage='template'):
+        return render_template(
+            'index.html',
+            logs=paginated_logs,
+            total_logs=total_logs,
+            graph=graph,
+            model_graph=model_graph,
+            metric_counts=metric_counts(rc),
+            filter_summary_message=Markup(f"<h3>Total Queries in Selected Range</h3>"),
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            view_by=view_by,
+            tz=tz,
+            graph_timezones=[z for z in dict.fromkeys([DISPLAY_TIMEZONE, LOG_TIMEZONE, 'UTC', *GRAPH_TIMEZONES, tz])
+                             if graph_timezone(z) == z],
+            selected_tool=filters.tool,
+            selected_model=filters.model,
+            selected_independent=filters.independent,
+            selected_response_review=filters.response_reviews,
+            selected_query_review=filters.query_reviews,
+            selected_urls_review=filters.urls_reviews,
+            selected_review_status=filters.review_status,
+            search=filters.search,
+
+            review_status_options=["All", "Reviewed", "Not Reviewed"],
+            tool_options=["All", "Code Generation", "Q&A"],
+            model_options=["All", *models],
+            is_independent_options=["All", *REVIEW_OPTIONS['is_independent_question']],
+            response_review_options=REVIEW_OPTIONS['response_review'],
+            query_review_options=REVIEW_OPTIONS['query_review'],
+            urls_review_options=REVIEW_OPTIONS['urls_review'],
+            page=page,
+            per_page=PER_PAGE,
+            total_pages=total_pages,
+            next_page=page + 1 if next_cursor else None,
+            prev_page=page - 1 if prev_cursor else None,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            param_str=param_str,
+            read_only=session.get('read_only', False)
         )
-    }
-
-    def param_escape(v): return v.replace('&','%26').replace('=','%3D').replace(' ','+')
-    param_str = (
-        f"&start_date={param_escape(start_date)}"
-        f"&end_date={param_escape(end_date)}"
-        f"&view_by={param_escape(view_by)}"
-        f"&independent={param_escape(selected_independent)}"
-        f"&review_status={param_escape(selected_review_status)}"
-    )
-    for rr in selected_response_review:
-        param_str += f"&response_review={param_escape(rr)}"
-    for qr in selected_query_review:
-        param_str += f"&query_review={param_escape(qr)}"
-    for ur in selected_urls_review:
-        param_str += f"&urls_review={param_escape(ur)}"
-
-    return render_template(
-        'index.html',
-        logs=paginated_logs,
-        total_logs=total_logs,
-        graph_html=generate_graph(mets),
-        metrics_text=[f"{k}: {v} queries" for k, v in mets.items()],
-        metrics_summary=metrics_summary,
-        filter_summary_message=Markup(f"<h3>Total Queries in Selected Range</h3>"),
-        start_date=start_date,
-        end_date=end_date,
-        view_by=view_by,
-        selected_tool=selected_tool,
-        selected_independent=selected_independent,
-        selected_response_review=selected_response_review,
-        selected_query_review=selected_query_review,
-        selected_urls_review=selected_urls_review,
-        selected_review_status=selected_review_status,
-
-        review_status_options=["All", "Reviewed", "Not Reviewed"],
-        tool_options=["All", "Code Generation", "Q&A"],
-        is_independent_options=["All", "Yes", "No"],
-        response_review_options=["Excellent", "Good", "Satisfactory", "Unsatisfactory"],
-        query_review_options=["Good", "Acceptable", "Bad", "I Don't Know"],
-        urls_review_options=["Good", "Acceptable", "Bad", "I Don't Know"],
-        page=page,
-        total_pages=total_pages,
-        next_page=next_page,
-        prev_page=prev_page,
-        param_str=param_str,
-        read_only=session.get('read_only', False)
-    )
 
 @app.route('/dashboard')
 @login_required
@@ -712,71 +2244,35 @@ def update_entry():
         data = request.json
         log_id = data['id']
 
-        # 1) Fetch the old values
-        with sqlite3.connect(DB_FILE) as conn:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT is_independent_question AS independent,
-                       response_review        AS response,
-                       query_review           AS query,
-                       urls_review            AS urls
-                  FROM logs
-                 WHERE id=?
-            """, (log_id,))
-            old = dict(cur.fetchone())
-
-        # 2) Build the new values (with your defaulting logic)
-        new = {
-            'independent': data.get('is_independent_question', ''),
-            'response':    data.get('response_review',       ''),
-            'query':       data.get('query_review',          ''),
-            'urls':        data.get('urls_review',           ''),
-            'notes':       data.get('notes',                 '')
+        # 1) The submitted values; save_review() applies the defaulting logic
+        fields = {
+            'is_independent_question': data.get('is_independent_question', ''),
+            'response_review':         data.get('response_review',         ''),
+            'query_review':            data.get('query_review',            ''),
+            'urls_review':             data.get('urls_review',             ''),
+            'notes':                   data.get('notes',                   '')
         }
 
-        if new['independent'] == 'No':
-            new.update({'response':'', 'query':'', 'urls':''})
-        else:
-            new['independent'] = 'Yes'
-            if not new['response']: new['response'] = 'Excellent'
-            if not new['query']:    new['query']    = 'Good'
-            if not new['urls']:     new['urls']     = 'Good'
-
         reviewer = session.get('user_id', 'anonymous')
         ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # The page's filters (query string), so the metric delta matches its summary
+        today = datetime.now().strftime('%Y-%m-%d')
+        filters = g.filters = LogFilter.from_args(request.args, today, today) if request.args else None
         
         # print(f"This is the reviewer: {reviewer}")
-        # 3) Update the DB
-        with sqlite3.connect(DB_FILE) as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE logs
-                   SET is_independent_question=?,
-                       response_review=?,
-                       query_review=?,
-                       urls_review=?,
-                       notes=?,
-                       last_updated_by=?,
-                       last_updated_at=?
-                 WHERE id=?
-            """, (
-                new['independent'],
-                new['response'],
-                new['query'],
-                new['urls'],
-                new['notes'],
-                reviewer,
-                ts,
-                log_id
-            ))
-            conn.commit()
-
-        # 4) Build a simple list of changed fields
-        changed = [k for k in old if old[k] != new[k]]
-        msg = f"Record {log_id} updated: fields changed = {', '.join(changed) or 'none'}"
-
-        # 5) Log to both console and file
+        # 2) Fetch the old values and update the DB in one transaction
+        conn = get_db()
+        with write_transaction(conn):
+            saved = save_review(conn.cursor(), log_id, fields, reviewer, ts, filters)
+            if saved is None:
+                return jsonify({'status': 'error', 'message': f'No record {log_id}.'}), 404
+            bump_data_version(conn)
+        before, after, new = saved
+
+        # 3) Build a simple list of changed fields
+        msg = review_change_message(log_id, before, new)
+
+        # 4) Log to both console and file
         print(msg)                   # console
         app.logger.info(msg)         # app.log
 
@@ -785,9 +2281,12 @@ def update_entry():
         return jsonify({
             'status': 'success',
             'last_updated_at': ts,
-            'last_updated_by': reviewer
+            'last_updated_by': reviewer,
+            'delta': metric_delta(before, after)
         })
 
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         err = f"Error updating record {data.get('id')}: {e}"
         print(err)
@@ -795,64 +2294,80 @@ def update_entry():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/update_entries', methods=['POST'])
+@login_required
+def update_entries():
+    """Save many reviews in one transaction.
+
+    Body: {"updates": [{"id": 1, "fields": {"is_independent_question": "No", ...}}, ...]}.
+    Omitted fields keep their current value; the same defaulting as
+    /update_entry applies. All-or-nothing: any invalid or unknown id fails
+    the whole batch.
+    """
+    if session.get('read_only'):
+        return jsonify({'status': 'error', 'message': 'Read-only users cannot update entries.'}), 403
+
+    updates = (request.get_json(silent=True) or {}).get('updates')
+    if not isinstance(updates, list) or not 0 < len(updates) <= REVIEW_BATCH_LIMIT:
+        return jsonify({'status': 'error',
+                        'message': f'updates must be a list of 1 to {REVIEW_BATCH_LIMIT} entries.'}), 400
+    allowed = set(REVIEW_OPTIONS) | {'notes'}
+    try:
+        batch = {}
+        for update in updates:
+            log_id, fields = (update.get('id'), update.get('fields')) if isinstance(update, dict) else (None, None)
+            # type() rather than isinstance(): a JSON true must not mean id 1
+            if type(log_id) is not int or not isinstance(fields, dict) or not set(fields) <= allowed:
+                raise ValueError(f"Invalid update: {update!r}")
+            if log_id in batch:
+                raise ValueError(f"Duplicate id {log_id}")
+            review_values(fields)  # reject unknown values before writing anything
+            batch[log_id] = fields
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    reviewer = session.get('user_id', 'anonymous')
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    today = datetime.now().strftime('%Y-%m-%d')
+    filters = LogFilter.from_args(request.args, today, today) if request.args else None
+
+    conn = get_db()
+    with write_transaction(conn):
+        ids = list(batch)
+        placeholders = ','.join('?' * len(ids))
+        found = {row[0] for row in conn.execute(f"SELECT id FROM logs WHERE id IN ({placeholders})", ids)}
+        missing = [log_id for log_id in ids if log_id not in found]
+        if missing:
+            return jsonify({'status': 'error', 'message': f'No records {missing}.'}), 404
+        cur = conn.cursor()
+        delta = defaultdict(int)
+        entries = []
+        for log_id, fields in batch.items():
+            before, after, new = save_review(cur, log_id, fields, reviewer, ts, filters)
+            for key, val in metric_delta(before, after).items():
+                delta[key] += val
+            entries.append({'id': log_id, 'last_updated_at': ts, **new})
+            app.logger.info(review_change_message(log_id, before, new))
+        bump_data_version(conn)
+
+    app.logger.info(f"Batch review by {reviewer}: {len(entries)} records updated.")
+    return jsonify({
+        'status': 'success',
+        'last_updated_by': reviewer,
+        'entries': entries,
+        'delta': {key: val for key, val in delta.items() if val}
+    })
+
 @app.route('/get_metrics', methods=['GET'])
+@conditional
 def get_metrics_endpoint():
-    # same filtering logic as home_route, including has_tags...
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    view_by = request.args.get('view_by', 'daily')
-    tool = request.args.get('tool', 'All')
-    independent = request.args.get('independent', 'All')
-    response_reviews = request.args.getlist('response_review')
-    query_reviews = request.args.getlist('query_review')
-    urls_reviews = request.args.getlist('urls_review')
-    review_status = request.args.get('review_status', 'All')
-
-    with sqlite3.connect(DB_FILE) as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        sql = "SELECT * FROM logs WHERE timestamp BETWEEN ? AND ?"
-        params = [f"{start_date} 00:00:00,000", f"{end_date} 23:59:59,999"]
-
-        # apply all filters...
-        if tool != 'All':
-            sql += " AND tool=?"
-            params.append(tool)
-        if independent != "All":
-            sql += " AND is_independent_question=?"
-            params.append(independent)
-        if response_reviews:
-            sql += " AND response_review IN ({})".format(','.join('?' for _ in response_reviews))
-            params.extend(response_reviews)
-        if query_reviews:
-            sql += " AND query_review IN ({})".format(','.join('?' for _ in query_reviews))
-            params.extend(query_reviews)
-        if urls_reviews:
-            sql += " AND urls_review IN ({})".format(','.join('?' for _ in urls_reviews))
-            params.extend(urls_reviews)
-        if review_status == "Reviewed":
-            sql += " AND (" + " OR ".join([
-                "is_independent_question<>''",
-                "response_review<>''",
-                "query_review<>''",
-                "urls_review<>''"
-                "last_updated_at IS NOT NULL"
-            ]) + ")"
-        elif review_status == "Not Reviewed":
-            sql += " AND (" + " AND ".join([
-                "is_independent_question='' ",
-                "response_review='' ",
-                "query_review='' ",
-                "urls_review='' "
-                "last_updated_at IS NULL"
-            ]) + ")"
-        
-        sql += " ORDER BY timestamp DESC"
-        c.execute(sql, params)
-        rows = [dict(r) for r in c.fetchall()]
+    # same filters as home_route
+    filters = g.filters = LogFilter.from_args(request.args)
 
-    mets = calculate_metrics(rows, view_by)
-    rc = calculate_review_counts(rows)
+    with get_db(readonly=True) as conn:
+        daily = query_filter_counts(conn.cursor(), filters)
+
+    rc = calculate_review_counts(daily)
 
     def pct(x, base): return round(x / base * 100, 1) if base > 0 else 0
 
@@ -909,209 +2424,135 @@ def get_metrics_endpoint():
         )
     }
 
-    return jsonify({'metrics_summary': metrics_summary})
-
-  # ----------------------------------- Endpoint to dynamically update graph --------------------------------------
-# @app.route('/update_graph', methods=['GET'])
-# def update_graph():
-#     # Get the latest logs
-#     start_date = request.args.get('start_date')
-#     end_date = request.args.get('end_date')
-#     view_by = request.args.get('view_by', 'daily')
-#     tool = request.args.get('tool', 'All')
-#     model = request.args.get('model', 'All')
-#     independent = request.args.get('independent', 'All')
-#     response_reviews = request.args.getlist('response_review')
-#     query_reviews = request.args.getlist('query_review')
-#     urls_reviews = request.args.getlist('urls_review')
-#     review_status = request.args.get('review_status', 'All')
-
-#     with sqlite3.connect(DB_FILE) as conn:
-#         conn.row_factory = sqlite3.Row
-#         c = conn.cursor()
-#         sql = "SELECT * FROM logs WHERE timestamp BETWEEN ? AND ?"
-#         params = [f"{start_date} 00:00:00,000", f"{end_date} 23:59:59,999"]
-
-#         # apply all filters...
-#         if tool != 'All':
-#             sql += " AND tool=?",
-#             params.append(tool)
-#         if model != "All":
-#             sql += " AND model=?"
-#             params.append(model)
-#         if independent != "All":
-#             sql += " AND is_independent_question=?"
-#             params.append(independent)
-#         if response_reviews:
-#             sql += " AND response_review IN ({})".format(','.join('?' for _ in response_reviews))
-#             params.extend(response_reviews)
-#         if query_reviews:
-#             sql += " AND query_review IN ({})".format(','.join('?' for _ in query_reviews))
-#             params.extend(query_reviews)
-#         if urls_reviews:
-#             sql += " AND urls_review IN ({})".format(','.join('?' for _ in urls_reviews))
-#             params.extend(urls_reviews)
-#         if review_status == "Reviewed":
-#             sql += " AND (" + " OR ".join([
-#                 "is_independent_question<>''",
-#                 "response_review<>''",
-#                 "query_review<>''",
-#                 "urls_review<>''"
-#                 "last_updated_at IS NOT NULL"
-#             ]) + ")"
-#         elif review_status == "Not Reviewed":
-#             sql += " AND (" + " AND ".join([
-#                 "is_independent_question='' ",
-#                 "response_review='' ",
-#                 "query_review='' ",
-#                 "urls_review='' "
-#                 "last_updated_at IS NULL"
-#             ]) + ")"
-        
-#         sql += " ORDER BY timestamp DESC"
-#         c.execute(sql, params)
-#         rows = [dict(r) for r in c.fetchall()]
-    
-#     # fig = generate_graph(rows)
-#     # fig_json = fig.to_plotly_json()
-#     # Updated and return the graph 
-#     # return Response(fig, cls=plotly.utils.PlotlyJSONEncoder, mimetype='application/json')
-#     return generate_graph(rows)
+    return jsonify({'metrics_summary': metrics_summary, 'counts': metric_counts(rc)})
+
+# --- Graph data ---
+@app.route('/graph_data', methods=['GET'])
+@login_required
+@conditional
+def graph_data():
+    today = datetime.now().strftime('%Y-%m-%d')
+    filters = g.filters = LogFilter.from_args(request.args, today, today)
+    view_by, tz = graph_options(request.args)
+    return jsonify(cached_graph(filters, view_by, tz, data_version()))
+
+@app.route('/model_graph_data', methods=['GET'])
+@login_required
+@conditional
+def model_graph_data():
+    """Per-model counts of every review dimension, plus the model graph."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    filters = g.filters = LogFilter.from_args(request.args, today, today)
+    return jsonify(cached_model_graph(filters, data_version()))
 
 @app.route('/update_table', methods=['POST'])
+@login_required
 def update_table():
-    # Read the latest changes or new log files 
-    latest_logs = read_logs_from_files()
-    # insert these into the database 
-    with sqlite3.connect(DB_FILE) as conn:
-        for log in latest_logs:
-            insert_log(conn, log)
-    
-    return jsonify({"status": "ok"})
+    # Read only what was appended to the log files since the last update, as a
+    # job; the same checks as POST /jobs/ingest apply
+    return start_job('ingest')
 
 # ----------------------------------- Download endpoint that is not necessary for our use case --------------------------------------
-# @app.route('/download_all', methods=['GET'])
-# def download_all():
-#     # --- Gather params ---
-#     file_type        = request.args.get('file_type', 'csv').lower()
-#     start_date       = request.args.get('start_date')
-#     end_date         = request.args.get('end_date')
-#     tool = request.args.get('tool', 'All')
-#     model = request.args.get('model', 'All')
-#     independent      = request.args.get('independent', 'All')
-#     response_reviews = request.args.getlist('response_review')
-#     query_reviews    = request.args.getlist('query_review')
-#     urls_reviews     = request.args.getlist('urls_review')
-#     review_status    = request.args.get('review_status', 'All')
-
-#     # --- Build & run query ---
-#     with sqlite3.connect(DB_FILE) as conn:
-#         conn.row_factory = sqlite3.Row
-#         c = conn.cursor()
-#         sql = "SELECT * FROM logs WHERE timestamp BETWEEN ? AND ?"
-#         params = [f"{start_date} 00:00:00,000", f"{end_date} 23:59:59,999"]
-        
-#         if tool != 'All':
-#             sql += " AND tool=?",
-#             params.append(tool)
-#         if model != "All":
-#             sql += " AND model=?"
-#             params.append(model)
-#         if independent != "All":
-#             sql += " AND is_independent_question=?"
-#             params.append(independent)
-#         if response_reviews:
-#             sql += " AND response_review IN ({})".format(",".join("?"*len(response_reviews)))
-#             params.extend(response_reviews)
-#         if query_reviews:
-#             sql += " AND query_review IN ({})".format(",".join("?"*len(query_reviews)))
-#             params.extend(query_reviews)
-#         if urls_reviews:
-#             sql += " AND urls_review IN ({})".format(",".join("?"*len(urls_reviews)))
-#             params.extend(urls_reviews)
-
-#         # Reviewed / Not Reviewed
-#         if review_status == "Reviewed":
-#             sql += " AND (" + " OR ".join([
-#                 "is_independent_question<>''",
-#                 "response_review<>''",
-#                 "query_review<>''",
-#                 "urls_review<>''",
-#                 "last_updated_at IS NOT NULL"
-#             ]) + ")"
-#         elif review_status == "Not Reviewed":
-#             sql += " AND (" + " AND ".join([
-#                 "is_independent_question='' ",
-#                 "response_review='' ",
-#                 "query_review='' ",
-#                 "urls_review='' ",
-#                 "last_updated_at IS NULL"
-#             ]) + ")"
-
-#         sql += " ORDER BY timestamp DESC"
-#         c.execute(sql, params)
-#         rows = [dict(r) for r in c.fetchall()]
-
-#     # --- Export ---
-#     timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-#     # CSV
-#     if file_type == 'csv':
-#         def generate_csv():
-#             buf = StringIO()
-#             writer = csv.writer(buf)
-#             writer.writerow([
-#                 'Timestamp','Query','Response', 'Tool', 'Model', 'Tester',
-#                 'Independent?','Response Review','Query Review','URLs Review',
-#                 'Last Updated By','Last Updated At'
-#             ])
-#             yield buf.getvalue()
-#             for log in rows:
-#                 buf.seek(0); buf.truncate(0)
-#                 writer.writerow([
-#                     log['timestamp'],
-#                     log['query'],
-#                     log['response'],
-#                     log['tool'],
-#                     log['model'],
-#                     log['tester'],
-#                     log['is_independent_question'],
-#                     log['response_review'],
-#                     log['query_review'],
-#                     log['urls_review'],
-#                     log.get('last_updated_by',''),
-#                     log.get('last_updated_at',''),
-#                 ])
-#                 yield buf.getvalue()
-
-#         return Response(
-#             generate_csv(),
-#             mimetype='text/csv',
-#             headers={'Content-Disposition': f'attachment; filename=logs_{timestamp_str}.csv'}
-#         )
-
-#     # XLS / XLSX
-#     elif file_type in ('xls', 'xlsx'):
-#         buf = BytesIO()
-#         df = pd.DataFrame(rows)
-#         # ensure columns order
-#         df = df[[
-#             'timestamp','query','response', 'tool', 'model', 'tester',
-#             'is_independent_question','response_review','query_review','urls_review',
-#             'last_updated_by','last_updated_at'
-#         ]]
-#         with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
-#             df.to_excel(writer, index=False, sheet_name='Logs')
-#         buf.seek(0)
-#         return send_file(
-#             buf,
-#             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-#             as_attachment=True,
-#             download_name=f'logs_{timestamp_str}.xlsx'
-#         )
-
-#     else:
-#         return "Invalid file type", 400
+@app.route('/download_all', methods=['GET'])
+@login_required
+def download_all():
+    file_type = request.args.get('file_type', 'csv').lower()
+    if file_type not in EXPORT_FORMATS:
+        return "Invalid file type", 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes', 'on')
+    # Without dates, export the whole archive
+    filters = g.filters = LogFilter.from_args(request.args, '0000-01-01', '9999-12-31')
+
+    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"logs_{timestamp_str}.{file_type}" + ('.gz' if compress else '')
+    return Response(
+        export_stream(filters, file_type, compress),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[file_type],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/export_snapshot', methods=['POST'])
+@login_required
+def export_snapshot():
+    if session.get('read_only') and 'snapshot' not in READ_ONLY_JOB_KINDS:
+        return jsonify({'status': 'error', 'message': 'Read-only users cannot start this job.'}), 403
+    if pq is None:
+        return jsonify({'status': 'error', 'message': SNAPSHOT_MISSING_PYARROW}), 501
+    job, created = submit_job('snapshot', user=session['user_id'])
+    return jsonify({'status': 'ok', 'snapshot_dir': SNAPSHOT_DIR, 'job': job, 'created': created}), 202
+
+# --- Job endpoints ---
+@app.route('/jobs', methods=['GET'])
+@login_required
+def list_jobs():
+    """The most recent jobs, newest first."""
+    cur = get_db(readonly=True).cursor()
+    cur.row_factory = sqlite3.Row
+    rows = cur.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT 50").fetchall()
+    return jsonify({'jobs': [job_dict(row) for row in rows]})
+
+@app.route('/jobs/<kind>', methods=['POST'])
+@login_required
+def start_job(kind):
+    """Start (or join) a job. Exports take the filters, file_type and gzip as query args."""
+    if kind not in JOB_KINDS:
+        return jsonify({'status': 'error', 'message': f'Unknown job kind {kind!r}.'}), 404
+    if session.get('read_only') and kind not in READ_ONLY_JOB_KINDS:
+        return jsonify({'status': 'error', 'message': 'Read-only users cannot start this job.'}), 403
+    if kind == 'snapshot' and pq is None:
+        return jsonify({'status': 'error', 'message': SNAPSHOT_MISSING_PYARROW}), 501
+    params = {}
+    if kind == 'export':
+        file_type = request.args.get('file_type', 'csv').lower()
+        if file_type not in EXPORT_FORMATS:
+            return jsonify({'status': 'error', 'message': 'Invalid file type.'}), 400
+        filters = LogFilter.from_args(request.args, '0000-01-01', '9999-12-31')
+        params = {
+            # Normalized, so equal filters find the same running export
+            'filters': filters.query_string(),
+            'file_type': file_type,
+            'compress': request.args.get('gzip', '').lower() in ('1', 'true', 'yes', 'on'),
+        }
+    job, created = submit_job(kind, params, user=session['user_id'])
+    return jsonify({'status': 'ok', 'job': job, 'created': created}), 202
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    # Polled every second: a plain read, never waiting for the write lock
+    job = fetch_job(get_db(readonly=True), job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'No job {job_id}.'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job_endpoint(job_id):
+    job = fetch_job(get_db(), job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'No job {job_id}.'}), 404
+    if session.get('read_only') and job['created_by'] != session['user_id']:
+        return jsonify({'status': 'error', 'message': 'Read-only users can only cancel their own jobs.'}), 403
+    return jsonify(cancel_job(job_id))
+
+@app.route('/jobs/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_job_export(job_id):
+    job = fetch_job(get_db(), job_id)
+    if job is None or job['kind'] != 'export':
+        return "No such export", 404
+    if job['created_by'] != session['user_id']:
+        return "Only the user who started an export can download it", 403
+    if job['status'] != 'succeeded':
+        return f"The export is {job['status']}", 409
+    path = os.path.abspath(os.path.join(EXPORT_DIR, job['result']['file']))
+    if not os.path.exists(path):
+        return "The export has expired", 410
+    compressed = job['params']['compress']
+    return send_file(
+        path, as_attachment=True, download_name=job['result']['download_name'],
+        mimetype='application/gzip' if compressed else EXPORT_FORMATS[job['params']['file_type']]
+    )
 
 # ----------------------------------- Functions corresponding to Existing Authorization system --------------------------------------
 
@@ -1163,5 +2604,147 @@ def update_table():
 #     session.clear()
 #     return redirect(url_for('home'))
 
+# --- Background ingestion ---
+def watcher_ingest():
+    # Appends are small; parse inline rather than start a process pool each time
+    counts = ingest_new_entries(workers=1, batch_size=WATCH_BATCH_SIZE, max_rows_per_sec=WATCH_MAX_ROWS_PER_SEC)
+    # Come back for held-back last records once their files go idle
+    return counts['held'] > 0
+
+def start_background_ingest():
+    """Start the log watcher thread in this process."""
+    return start_log_watcher(
+        LOG_DIR, watcher_ingest, lambda name: log_source_name(name) is not None,
+        debounce=WATCH_DEBOUNCE, min_interval=WATCH_MIN_INTERVAL,
+        poll_interval=WATCH_POLL_INTERVAL, logger=app.logger
+    )
+
+# --- CLI commands ---
+# Run with: flask --app app <command>. Each applies pending migrations first.
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database or apply pending migrations."""
+    applied = init_db(start_jobs=False)
+    click.echo(f"Applied migrations {applied}." if applied else "Database is up to date.")
+
+@app.cli.command('ingest')
+@click.option('--workers', type=int, default=None, help='Parser processes (default: INGEST_WORKERS).')
+def ingest_command(workers):
+    """Ingest new log entries from LOG_DIR."""
+    ensure_db(start_jobs=False)
+    counts = ingest_new_entries(workers=workers)
+    click.echo(f"Inserted {counts['inserted']} entries, skipped {counts['skipped']} duplicates.")
+
+@app.cli.command('watch')
+def watch_command():
+    """Watch LOG_DIR and ingest new entries as they are written."""
+    ensure_db(start_jobs=False)
+    thread, stop = start_background_ingest()
+    click.echo(f"Watching {LOG_DIR}; press Ctrl+C to stop.")
+    try:
+        while thread.is_alive():
+            thread.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the metrics rollup tables from the logs table."""
+    ensure_db(start_jobs=False)
+    with get_db() as conn:
+        rebuild_rollups(conn)
+    click.echo("Rebuilt metrics rollups.")
+
+@app.cli.command('backfill-rendered')
+def backfill_rendered_command():
+    """Pre-render (sanitize + markdown) every stored response."""
+    ensure_db(start_jobs=False)
+    rendered, stale = backfill_rendered_responses()
+    click.echo(f"Rendered {rendered} responses; removed {stale} stale cache entries.")
+
+@app.cli.command('backfill-models')
+@click.option('--workers', type=int, default=None, help='Parser processes (default: INGEST_WORKERS).')
+def backfill_models_command(workers):
+    """Fill in the model of rows ingested before it was stored."""
+    ensure_db(start_jobs=False)
+    updated = backfill_models(workers=workers)
+    click.echo(f"Set the model of {updated} entries.")
+
+@app.cli.command('export-parquet')
+@click.option('--out', 'snapshot_dir', default=SNAPSHOT_DIR, show_default=True,
+              help='Snapshot directory.')
+def export_parquet_command(snapshot_dir):
+    """Write new and changed days to the date-partitioned Parquet snapshot."""
+    ensure_db(start_jobs=False)
+    try:
+        counts = write_snapshot(snapshot_dir)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Wrote {counts['written']} partitions to {snapshot_dir}, deleted {counts['deleted']}; "
+               f"{counts['unchanged']} unchanged.")
+
+class QueryPlanCursor:
+    """Cursor stand-in that records EXPLAIN QUERY PLAN instead of running queries."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.plans = []
+
+    def execute(self, sql, params=()):
+        rows = self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        self.plans.append([row[3] for row in rows])
+
+    def fetchone(self):
+        return (0,)
+
+    def fetchall(self):
+        return []
+
+@app.cli.command('explain-filters')
+@click.option('--all', 'show_all', is_flag=True, help='Print every plan, not only those with a scan.')
+def explain_filters_command(show_all):
+    """Print query plans for every home page filter combination."""
+    ensure_db(start_jobs=False)
+    with get_db(readonly=True) as conn:
+        tool = (conn.execute("SELECT tool FROM logs LIMIT 1").fetchone() or ('FABRIC',))[0]
+        model = (conn.execute("SELECT model FROM logs LIMIT 1").fetchone() or ('gpt-4o',))[0]
+        combos = itertools.product(
+            ['All', tool], ['All', model], ['All', 'Yes'], [(), ('Good',)], [(), ('Bad', 'Good')],
+            [(), ('Good',)], REVIEW_STATUSES, ['', 'error']
+        )
+        scans = total = 0
+        for combo in combos:
+            filters = LogFilter('2025-01-01', '2025-12-31', *combo)
+            where, params = filters.log_sql()
+            c = QueryPlanCursor(conn)
+            c.execute(f"SELECT COUNT(*) FROM logs WHERE {where}", params)
+            if filters.match:
+                fetch_search_page(c, filters, 1, PER_PAGE)
+                labels = ['count', 'search page', 'metrics', 'hourly graph']
+            else:
+                fetch_log_page(c, where, params, None, None, PER_PAGE)
+                fetch_log_page(c, where, params, ('2025-06-01 00:00:00,000', 1), 'after', PER_PAGE)
+                fetch_log_page(c, where, params, ('2025-06-01 00:00:00,000', 1), 'before', PER_PAGE)
+                fetch_last_page(c, where, params, PER_PAGE)
+                labels = ['count', 'first page', 'next page', 'previous page', 'last page', 'metrics',
+                          'hourly graph']
+            query_filter_counts(c, filters)
+            query_hourly_totals(c, filters)
+            for label, plan in zip(labels, c.plans):
+                total += 1
+                scan = any(re.match(r'SCAN (logs|metrics_daily|metrics_hourly)\b', line) for line in plan)
+                scans += scan
+                if scan or show_all:
+                    click.echo(f"{'SCAN ' if scan else ''}{label}: {where}")
+                    for line in plan:
+                        click.echo(f"    {line}")
+        click.echo(f"{scans} of {total} queries scan a whole table.")
+
 if __name__ == '__main__':
+    # With the debug reloader only the serving child (WERKZEUG_RUN_MAIN) sets up
+    # the database and the watcher; under flask run or a WSGI server the
+    # first request runs ensure_db()
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ensure_db()
+        if WATCH_LOGS:
+            start_background_ingest()
     app.run(debug=True, host=os.getenv('FLASK_HOST', '127.0.0.1'), port=int(os.getenv('FLASK_PORT', 5000)))
\ No newline at end of file
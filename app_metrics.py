@@ -0,0 +1,263 @@
+# app_metrics.py
+#
+# In-process instrumentation: counters, gauges and histograms rendered in the
+# Prometheus text format, and an sqlite3 connection class that times every
+# statement and counts the rows it returns or changes. Values are kept per
+# process and reset when it restarts.
+
+import bisect
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct SQL statements tracked; any beyond are counted under "other"
+SQL_STATEMENT_LIMIT = 500
+
+REGISTRY = []
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{format_labels(self.labels, key, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts), total, n) for key, (counts, total, n) in sorted(self.values.items())]
+        samples = []
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, [('le', format_value(float(bound)))], cumulative))
+            samples.append((f"{self.name}_bucket", key, [('le', '+Inf')], n))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), n))
+        return samples
+
+
+def render_metrics(registry=REGISTRY):
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# --- SQL statements ---
+sql_seconds = Counter('qa_sql_statement_seconds_total',
+                      'Time spent executing and fetching, by SQL statement', ('statement',))
+sql_calls = Counter('qa_sql_statement_calls_total', 'Executions, by SQL statement', ('statement',))
+sql_rows = Counter('qa_sql_statement_rows_total',
+                   'Rows returned or changed, by SQL statement', ('statement',))
+
+sql_labels = {}
+sql_labels_lock = threading.Lock()
+# Per-thread totals for the request in progress (see start_request_sql)
+request_sql = threading.local()
+
+PLACEHOLDER_LIST_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def statement_label(sql):
+    """Whitespace collapsed and placeholder lists shortened, so IN (?, ?, ?) of
+    any length is one statement."""
+    label = sql_labels.get(sql)
+    if label is None:
+        label = PLACEHOLDER_LIST_RE.sub('?, ...', ' '.join(sql.split()))
+        with sql_labels_lock:
+            if len(sql_labels) >= SQL_STATEMENT_LIMIT:
+                return 'other'
+            sql_labels[sql] = label
+    return label
+
+
+def record_sql(statement, seconds, rows, calls=0):
+    if calls:
+        sql_calls.inc(calls, statement=statement)
+    sql_seconds.inc(seconds, statement=statement)
+    if rows:
+        sql_rows.inc(rows, statement=statement)
+    totals = getattr(request_sql, 'totals', None)
+    if totals is not None:
+        totals['seconds'] += seconds
+        totals['calls'] += calls
+        slowest = totals['by_statement']
+        slowest[statement] = slowest.get(statement, 0) + seconds
+
+
+def start_request_sql():
+    request_sql.totals = {'seconds': 0.0, 'calls': 0, 'by_statement': {}}
+
+
+def finish_request_sql():
+    """This thread's SQL totals since start_request_sql(), or None."""
+    totals = getattr(request_sql, 'totals', None)
+    request_sql.totals = None
+    return totals
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records the time and rows of each statement, fetches included.
+
+    Rows read by iterating are totalled on the cursor and recorded once the
+    statement is exhausted, replaced or the cursor closed, not per row.
+    """
+    statement = None
+    iter_seconds = 0.0
+    iter_rows = 0
+
+    def _flush_iterated(self):
+        if self.iter_rows:
+            record_sql(self.statement, self.iter_seconds, self.iter_rows)
+            self.iter_seconds, self.iter_rows = 0.0, 0
+
+    def _timed(self, method, sql, parameters):
+        self._flush_iterated()
+        self.statement = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            # rowcount is -1 for queries; their rows are counted as fetched
+            record_sql(self.statement, time.perf_counter() - start, max(self.rowcount, 0), calls=1)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def _fetched(self, start, rows):
+        if self.statement is not None:
+            record_sql(self.statement, time.perf_counter() - start, rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush_iterated()
+            raise
+        self.iter_seconds += time.perf_counter() - start
+        self.iter_rows += 1
+        return row
+
+    def close(self):
+        self._flush_iterated()
+        super().close()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Pass as sqlite3.connect(factory=...) to time every statement."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The built-in shortcuts create a plain cursor; route them through ours
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
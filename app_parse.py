@@ -0,0 +1,187 @@
+# app_parse.py
+#
+# Log file parsing, and the process pool that parses files in parallel during
+# ingestion. Kept apart from app.py, with only standard-library imports, so
+# that pool workers start without importing the web app (Flask, pandas,
+# markdown, ...). Functions handed to the pool must stay at module level.
+# (Started as `python app.py`, app.py is the main module, which spawned
+# workers always re-import; under `flask run` or a WSGI server they do not.)
+
+import bz2
+import gzip
+import lzma
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+
+# Rotated logs may be compressed; they are decompressed as a stream
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Pool workers start from a clean server process: forking from a thread of
+# the multi-threaded web server could copy locks held by other threads
+INGEST_POOL_CONTEXT = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def open_log_file(filepath):
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(filepath)[1], open)
+    return opener(filepath, 'rb')
+
+# --- Parallel file parsing ---
+def iter_log_file(filepath, offset=0, hold_tail=False):
+    # Offsets count uncompressed bytes; seeking an archive decompresses up to them
+    with open_log_file(filepath) as f:
+        f.seek(offset)
+        yield from iter_log_records(f, datetime.min, datetime.now(), hold_tail=hold_tail)
+
+def parse_log_file(filepath, offset=0, hold_tail=False):
+    return list(iter_log_file(filepath, offset, hold_tail))
+
+def map_log_files(fn, tasks, workers):
+    """Yield a Future for fn(*task) for each task, in order.
+
+    With more than one worker the tasks run in a process pool, at most
+    2 * workers ahead of the consumer; otherwise they run inline, lazily.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            future = Future()
+            try:
+                future.set_result(fn(*task))
+            except Exception as e:
+                future.set_exception(e)
+            yield future
+        return
+
+    context = multiprocessing.get_context(INGEST_POOL_CONTEXT)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(fn, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+# --- Log parsing ---
+LOG_RECORD_RE = re.compile(
+        r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - QUERY: (.*?)\nRESPONSE:\s+(.*?)(?:\n+|\s+)MODEL:\s+(.*?)\nTOOL: (.*?)(?:\nTESTER: (.*?))?(?=\n\d{4}-\d{2}-\d{2}|\Z)',
+                re.DOTALL | re.MULTILINE
+        )
+
+# Start of a record: "YYYY-MM-DD HH:MM:SS,mmm - QUERY: " at the beginning of a line
+LOG_HEADER_RE = re.compile(rb'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - QUERY: ', re.MULTILINE)
+LOG_HEADER_LEN = len(b'YYYY-MM-DD HH:MM:SS,mmm - QUERY: ')
+
+LOG_CHUNK_SIZE = 1 << 20
+# Bytes kept while a malformed record waits for the rest of its fields
+LOG_PENDING_LIMIT = 16 << 20
+
+def entry_from_match(match, start_date, end_date):
+    ts_str = match.group(1)
+    try:
+        ts = datetime.strptime(ts_str, '%Y-%m-%d %H:%M:%S,%f')
+    except ValueError:
+        return None
+    if not start_date <= ts <= end_date:
+        return None
+    response = match.group(3).strip()
+    # Remove any trailing lines consisting solely of '#' characters.
+    response = re.sub(r'\n#+\s*$', '', response)
+    return {
+        'timestamp': ts_str,
+        'query': match.group(2).strip(),
+        'response': response,
+        'model': match.group(4).strip(),
+        'tool': match.group(5).strip(),
+        'tester': match.group(6).strip() if match.group(6) else '',
+        'is_independent_question': '',
+        'response_review': '',
+        'query_review': '',
+        'urls_review': ''
+    }
+
+def parse_log(content, start_date, end_date):
+    entries = []
+    for match in LOG_RECORD_RE.finditer(content):
+        entry = entry_from_match(match, start_date, end_date)
+        if entry:
+            entries.append(entry)
+    return entries
+
+def iter_log_segments(f, chunk_size=LOG_CHUNK_SIZE):
+    """Split a binary log stream at record headers.
+
+    Yields (start, end, raw) with byte offsets in the file; only one record's
+    worth of bytes (plus one chunk) is held in memory at a time.
+    """
+    buf = bytearray()
+    buf_start = f.tell()
+    scan = 1
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        while True:
+            m = LOG_HEADER_RE.search(buf, scan)
+            if not m:
+                scan = max(1, len(buf) - LOG_HEADER_LEN)
+                break
+            yield buf_start, buf_start + m.start(), bytes(buf[:m.start()])
+            del buf[:m.start()]
+            buf_start += m.start()
+            scan = 1
+    if buf:
+        yield buf_start, buf_start + len(buf), bytes(buf)
+
+def decode_segment(raw):
+    # Same newline handling as reading the file in text mode
+    return raw.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+def drain_pending(pending, start_date, end_date, final):
+    """Match records from the front of `pending` [(start, end, text), ...].
+
+    A segment that does not parse on its own is kept and retried together
+    with the following ones, exactly as LOG_RECORD_RE would run across them
+    over the whole file; it is only given up on at the end of the input.
+    """
+    while pending:
+        text = ''.join(seg[2] for seg in pending)
+        match = LOG_RECORD_RE.match(text)
+        if match:
+            pos = n = 0
+            while n < len(pending) and pos < match.end():
+                pos += len(pending[n][2])
+                n += 1
+            end = pending[n - 1][1]
+            del pending[:n]
+            entry = entry_from_match(match, start_date, end_date)
+            if entry:
+                yield entry, end
+        elif final or sum(seg[1] - seg[0] for seg in pending) > LOG_PENDING_LIMIT:
+            del pending[0]
+        else:
+            return
+
+def iter_log_records(f, start_date, end_date, chunk_size=LOG_CHUNK_SIZE, hold_tail=False):
+    """Stream parsed entries from a binary file object, one record at a time.
+
+    Yields (entry, end_offset) where end_offset is the file position just past
+    the record. Gives the same entries as parse_log() on the whole file. With
+    hold_tail, the last record is not yielded: it may still be being written,
+    so it is left for a read that sees the next record's header.
+    """
+    pending = []
+    tail = None
+    for start, end, raw in iter_log_segments(f, chunk_size):
+        if tail is not None:
+            pending.append(tail)
+            yield from drain_pending(pending, start_date, end_date, final=False)
+        # Bytes before the first header can never start a record
+        tail = (start, end, decode_segment(raw)) if LOG_HEADER_RE.match(raw) else None
+
+    if tail is not None and not hold_tail:
+        pending.append(tail)
+    yield from drain_pending(pending, start_date, end_date, final=True)
@@ -0,0 +1,161 @@
+# app_watcher.py
+#
+# Background log-directory watcher: waits for changes to the log files
+# (inotify on Linux, periodic stat polling elsewhere), lets bursts of appends
+# settle, then calls the ingest function.
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# Default logger; start_log_watcher() is normally given the Flask app's, whose
+# name depends on how the app was started ('app' or '__main__')
+default_logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def inotify_waiter(log_dir, is_log_file):
+    """Return (wait(timeout) -> bool, close()) backed by inotify, or None if unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(log_dir), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+    except (OSError, AttributeError):
+        return None
+
+    def wait(timeout):
+        changed = False
+        deadline = time.monotonic() + timeout
+        while not changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                break
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            pos = 0
+            while pos < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+                name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b'\0')
+                pos += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW or is_log_file(os.fsdecode(name)):
+                    changed = True
+        return changed
+
+    return wait, lambda: os.close(fd)
+
+
+def polling_waiter(log_dir, is_log_file, interval, logger=default_logger):
+    """Return wait(timeout) -> bool that compares directory snapshots."""
+    def snapshot():
+        state = {}
+        try:
+            with os.scandir(log_dir) as entries:
+                for entry in entries:
+                    if is_log_file(entry.name):
+                        st = entry.stat()
+                        state[entry.name] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            logger.error(f"Error scanning {log_dir}: {e}")
+        return state
+
+    last = {'state': snapshot(), 'at': time.monotonic()}
+
+    def wait(timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            next_scan = last['at'] + interval
+            if next_scan > deadline:
+                time.sleep(max(0, deadline - time.monotonic()))
+                return False
+            time.sleep(max(0, next_scan - time.monotonic()))
+            current = snapshot()
+            last['at'] = time.monotonic()
+            if current != last['state']:
+                last['state'] = current
+                return True
+
+    return wait
+
+
+def watch_log_dir(log_dir, ingest, is_log_file, stop, debounce=2.0, max_delay=30.0,
+                  min_interval=5.0, poll_interval=5.0, logger=default_logger):
+    """Run ingest() whenever log files in log_dir change, until stop is set.
+
+    A burst of appends is debounced: ingestion starts once the directory has
+    been quiet for `debounce` seconds, or `max_delay` seconds after the first
+    change. Runs are at least `min_interval` seconds apart. If ingest()
+    returns true, it runs again even without a further change.
+    """
+    waiter = inotify_waiter(log_dir, is_log_file)
+    if waiter:
+        wait, close = waiter
+        logger.info(f"Watching {log_dir} with inotify.")
+    else:
+        logger.info(f"Watching {log_dir} by polling every {poll_interval}s.")
+        wait, close = polling_waiter(log_dir, is_log_file, poll_interval, logger), None
+    try:
+        watch_loop(wait, ingest, stop, debounce, max_delay, min_interval, logger)
+    finally:
+        if close:
+            close()
+        logger.info(f"Stopped watching {log_dir}.")
+
+
+def watch_loop(wait, ingest, stop, debounce, max_delay, min_interval, logger):
+    last_run = 0.0
+    changed = True  # catch up with anything written while we were not running
+    while not stop.is_set():
+        if not changed:
+            changed = wait(1.0)
+            continue
+
+        first = time.monotonic()
+        while time.monotonic() - first < max_delay and wait(debounce):
+            pass
+        if stop.wait(max(0, min_interval - (time.monotonic() - last_run))):
+            break
+
+        try:
+            changed = bool(ingest())
+        except Exception:
+            logger.exception("Background ingest failed")
+            changed = False
+        last_run = time.monotonic()
+
+
+def start_log_watcher(log_dir, ingest, is_log_file, **options):
+    """Start watch_log_dir() in a daemon thread; returns (thread, stop_event).
+
+    Pass logger=app.logger so its messages go where the app's do.
+    """
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_log_dir, args=(log_dir, ingest, is_log_file, stop),
+        kwargs=options, name='log-watcher', daemon=True
+    )
+    thread.start()
+    return thread, stop
@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+#
+# Benchmark suite: run.py times ingestion and the main routes on synthetic
+# logs from loggen.py. See "Benchmarks" in README.md.
@@ -0,0 +1,83 @@
+# benchmarks/bench_ingest.py
+#
+# Compares the old per-row insert (SELECT COUNT + INSERT + commit for every
+# entry) with the bulk insert_logs() path on a fresh database built by the
+# app's own MIGRATIONS, so both pay for its indexes and triggers (full-text
+# search, rollups, change counters) as real ingestion does.
+#
+#   uv run python benchmarks/bench_ingest.py --records 100000
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.gettempdir(), 'bench_unused.db'))
+
+from app import LOG_INSERT_COLUMNS, insert_logs, migrate  # noqa: E402
+
+
+def make_entries(n):
+    for i in range(n):
+        day, rest = divmod(i, 86400)
+        yield {
+            'timestamp': f"2025-{1 + day // 28 % 12:02d}-{1 + day % 28:02d} "
+                         f"{rest // 3600:02d}:{rest // 60 % 60:02d}:{rest % 60:02d},{i % 1000:03d}",
+            'query': f"How do I reserve slice resources, variant {i}?",
+            'response': "Use the FABlib API to create a slice.\n" * (1 + i % 20),
+            'model': f"model-{i % 3}",
+            'tool': 'Q&A' if i % 2 else 'Code Generation',
+            'tester': f"tester{i % 5}" if i % 3 else '',
+            'is_independent_question': '',
+            'response_review': '',
+            'query_review': '',
+            'urls_review': '',
+        }
+
+
+def per_row_insert(conn, entries):
+    # The pre-bulk insert_log() loop, kept here as the baseline
+    placeholders = ', '.join('?' for _ in LOG_INSERT_COLUMNS)
+    for log in entries:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM logs WHERE timestamp=? AND query=?", (log['timestamp'], log['query']))
+        if c.fetchone()[0] == 0:
+            c.execute(f"INSERT INTO logs ({', '.join(LOG_INSERT_COLUMNS)}) VALUES ({placeholders})",
+                      tuple(log[k] for k in LOG_INSERT_COLUMNS))
+            conn.commit()
+
+
+def run(label, n, load):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        # As the app's connections: WAL, synchronous=NORMAL
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        migrate(conn)
+        start = time.perf_counter()
+        load(conn, make_entries(n))
+        elapsed = time.perf_counter() - start
+        rows = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+        conn.close()
+    print(f"{label:<12} {n:>9} records  {elapsed:8.2f}s  {n / elapsed:>10.0f} rec/s  ({rows} rows)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row vs bulk insert benchmark")
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--skip-per-row', action='store_true',
+                        help="only time the bulk path (the per-row baseline commits every row)")
+    args = parser.parse_args()
+
+    bulk = run('bulk', args.records, insert_logs)
+    if not args.skip_per_row:
+        per_row = run('per-row', args.records, per_row_insert)
+        print(f"speedup: {per_row / bulk:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/loggen.py
+#
+# Deterministic generator of synthetic FABRIC assistant logs in the
+# *_query.log format the app ingests (see "Expected log format" in README.md).
+# The same (records, days, seed) always gives byte-identical files.
+#
+#   uv run python -m benchmarks.loggen /tmp/fabric-logs --records 1000000
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+START = datetime(2025, 1, 1)
+# Records of a day are spread over these hours, leaving room for appends
+DAY_SPAN_MS = 12 * 3600 * 1000
+DAY_START = timedelta(hours=8)
+APPEND_START = timedelta(hours=20, minutes=30)
+
+MODELS = ['gpt-4o', 'gpt-4o-mini', 'claude-3-5-sonnet', 'llama-3.1-70b']
+TOOLS = ['Q&A', 'Code Generation']
+TESTERS = ['alice', 'bob', 'carol', 'dave', 'erin']
+TOPICS = [
+    'create a slice with two nodes on different sites',
+    'attach a GPU to a node',
+    'reserve a dedicated NIC',
+    'set up an L2 bridge between sites',
+    'use FABlib to list available resources',
+    'renew a slice before it expires',
+    'configure IPv6 on the FABNetv6 service',
+    'upload my SSH key to the portal',
+    'measure bandwidth between two nodes',
+    'run a Jupyter notebook on FABRIC',
+]
+SENTENCES = [
+    "Use the FABlib API to create a slice and add the nodes you need.",
+    "Call `slice.submit()` once the topology is complete; it blocks until the slice is ready.",
+    "Each site publishes its available cores, RAM, disk and components.",
+    "See https://learn.fabric-testbed.net/knowledge-base/ for a step-by-step guide.",
+    "Leases last 24 hours by default and can be renewed up to the project limit.",
+    "Network services such as L2Bridge and FABNetv4 connect interfaces across nodes.",
+    "**Note:** GPU and SmartNIC components must be requested when the node is added.",
+    "You can check the slice state with `slice.get_state()` or on the portal.",
+]
+CODE_BLOCK = (
+    "```python\n"
+    "from fabrictestbed_extensions.fablib.fablib import FablibManager\n"
+    "fablib = FablibManager()\n"
+    "slice = fablib.new_slice(name='{name}')\n"
+    "node = slice.add_node(name='node1', site='{site}', cores={cores}, ram={ram})\n"
+    "slice.submit()\n"
+    "```"
+)
+SITES = ['TACC', 'STAR', 'UTAH', 'MICH', 'NCSA', 'WASH']
+
+
+def response_lines(r):
+    """A response of varied length: mostly short, sometimes long, with code and links."""
+    size = r.random()
+    n = r.randint(1, 3) if size < 0.6 else r.randint(4, 15) if size < 0.95 else r.randint(40, 200)
+    lines = [r.choice(SENTENCES) for _ in range(n)]
+    if r.random() < 0.3:
+        lines.insert(r.randint(0, len(lines)), CODE_BLOCK.format(
+            name=f"slice-{r.randint(1, 999)}", site=r.choice(SITES),
+            cores=r.choice([2, 4, 8]), ram=r.choice([8, 16, 32])
+        ))
+    if r.random() < 0.2:
+        # Trailing separator block, stripped by the parser
+        lines.append('#' * r.randint(3, 40))
+    return lines
+
+
+def format_record(ts, r, i):
+    query = f"How do I {r.choice(TOPICS)}? (#{i})"
+    text = f"{ts:%Y-%m-%d %H:%M:%S},{ts.microsecond // 1000:03d} - QUERY: {query}\n"
+    text += "RESPONSE: " + "\n".join(response_lines(r)) + "\n"
+    text += f"MODEL: {r.choice(MODELS)}\nTOOL: {r.choice(TOOLS)}\n"
+    if r.random() < 0.6:
+        text += f"TESTER: {r.choice(TESTERS)}\n"
+    return text
+
+
+def record_rng(seed, i):
+    # Independent of how many records come before, so appends are reproducible too
+    return random.Random(seed * 1_000_003 + i)
+
+
+def log_path(log_dir, day):
+    return os.path.join(log_dir, f"{START + timedelta(days=day):%Y%m%d}1200_query.log")
+
+
+def write_logs(log_dir, records, days=30, seed=0):
+    """Write `records` entries spread evenly over `days` daily files; returns the paths."""
+    os.makedirs(log_dir, exist_ok=True)
+    paths = []
+    first = 0
+    for day in range(days):
+        count = records // days + (day < records % days)
+        path = log_path(log_dir, day)
+        base = START + timedelta(days=day) + DAY_START
+        with open(path, 'w', encoding='utf-8') as f:
+            for j in range(count):
+                ts = base + timedelta(milliseconds=j * DAY_SPAN_MS // max(count, 1))
+                f.write(format_record(ts, record_rng(seed, first + j), first + j))
+        first += count
+        paths.append(path)
+    return paths
+
+
+def append_logs(log_dir, records, count, days=30, seed=0, batch=0):
+    """Append `count` new entries to the last day's file, as a live log would grow.
+
+    `records` is the size of the original set (indexes continue from it);
+    successive appends use increasing `batch` numbers.
+    """
+    path = log_path(log_dir, days - 1)
+    base = START + timedelta(days=days - 1) + APPEND_START + timedelta(minutes=batch)
+    first = records + batch * count
+    with open(path, 'a', encoding='utf-8') as f:
+        for j in range(count):
+            ts = base + timedelta(milliseconds=j * 60000 // max(count, 1))
+            f.write(format_record(ts, record_rng(seed, first + j), first + j))
+    return path
+
+
+def date_range(days):
+    """(first, last) day of a generated set as YYYY-MM-DD."""
+    return f"{START:%Y-%m-%d}", f"{START + timedelta(days=days - 1):%Y-%m-%d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic *_query.log files")
+    parser.add_argument('log_dir')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_logs(args.log_dir, args.records, args.days, args.seed)
+    size = sum(os.path.getsize(p) for p in paths)
+    print(f"Wrote {args.records} records in {len(paths)} files ({size / 1e6:.1f} MB) to {args.log_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+# benchmarks/run.py
+#
+# Reproducible benchmark suite. Generates a synthetic log set (loggen.py),
+# then times parsing, ingestion and the main routes against a throwaway
+# database. Every benchmark runs in its own process, so peak RSS is its own.
+#
+#   uv run python -m benchmarks.run --records 100000 --out bench.json
+#   uv run python -m benchmarks.run --records 100000 --compare bench.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import app_parse
+from benchmarks.loggen import START, append_logs, write_logs
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Date ranges for the route benchmarks, ending on the last generated day (None: all days)
+RANGES = [('1d', 1), ('7d', 7), ('30d', 30), ('all', None)]
+# Share of the original record count appended per incremental ingest
+APPEND_FRACTION = 0.01
+
+
+# --- Benchmarks (run in the child process, with app imported) ---
+def bench_parse_log(app, spec):
+    paths = sorted(os.path.join(spec['log_dir'], name) for name in os.listdir(spec['log_dir']))
+    latencies, items, size = [], 0, 0
+    for _ in range(spec['repeat']):
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+            start = time.perf_counter()
+            entries = app_parse.parse_log(content, datetime.min, datetime.max)
+            latencies.append(time.perf_counter() - start)
+            items += len(entries)
+            size += len(content.encode('utf-8'))
+    return {'items': items, 'unit': 'records', 'bytes': size, 'latencies': latencies}
+
+
+def bench_parse_files(app, spec):
+    # The parsing half of ingestion, through the same worker pool
+    paths = [p for _, p, _ in app.list_log_sources()]
+    size = sum(os.path.getsize(p) for p in paths)
+    latencies, items = [], 0
+    for _ in range(spec['repeat']):
+        start = time.perf_counter()
+        futures = app_parse.map_log_files(app_parse.parse_log_file, [(p,) for p in paths], spec['workers'])
+        items += sum(len(future.result()) for future in futures)
+        latencies.append(time.perf_counter() - start)
+    return {'items': items, 'unit': 'records', 'bytes': size * spec['repeat'], 'latencies': latencies}
+
+
+def bench_ingest_full(app, spec):
+    # Needs a fresh database, so it runs once whatever --repeat says
+    size = sum(os.path.getsize(p) for _, p, _ in app.list_log_sources())
+    start = time.perf_counter()
+    counts = app.ingest_new_entries(workers=spec['workers'])
+    return {'items': counts['inserted'], 'unit': 'records', 'bytes': size,
+            'latencies': [time.perf_counter() - start]}
+
+
+def bench_ingest_incremental(app, spec):
+    count = max(1, int(spec['records'] * APPEND_FRACTION))
+    latencies, items, size = [], 0, 0
+    for batch in range(spec['repeat']):
+        before = os.path.getsize(app.list_log_sources()[-1][1])
+        path = append_logs(spec['log_dir'], spec['records'], count, spec['days'], spec['seed'], batch)
+        size += os.path.getsize(path) - before
+        start = time.perf_counter()
+        items += app.ingest_new_entries(workers=spec['workers'])['inserted']
+        latencies.append(time.perf_counter() - start)
+    return {'items': items, 'unit': 'records', 'bytes': size, 'latencies': latencies}
+
+
+def date_filter(spec, days):
+    last = START + timedelta(days=spec['days'] - 1)
+    first = START if days is None else max(START, last - timedelta(days=days - 1))
+    return {'start_date': f"{first:%Y-%m-%d}", 'end_date': f"{last:%Y-%m-%d}"}
+
+
+def logged_in_client(app):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'benchmark'
+    return client
+
+
+def time_requests(send, n):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = send(i)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return {'items': n, 'unit': 'requests', 'latencies': latencies}
+
+
+def bench_home_route(app, spec):
+    client = logged_in_client(app)
+    query = date_filter(spec, spec['range_days'])
+    return time_requests(lambda i: client.get('/', query_string=query), spec['requests'])
+
+
+def bench_get_metrics(app, spec):
+    client = logged_in_client(app)
+    query = date_filter(spec, spec['range_days'])
+    return time_requests(lambda i: client.get('/get_metrics', query_string=query), spec['requests'])
+
+
+def bench_update_entry(app, spec):
+    client = logged_in_client(app)
+    query = date_filter(spec, 30)
+    with sqlite3.connect(spec['db']) as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM logs ORDER BY id")]
+    r = random.Random(spec['seed'])
+    updates = [
+        dict({col: r.choice(options) for col, options in app.REVIEW_OPTIONS.items()},
+             id=r.choice(ids), notes=f"benchmark {i}")
+        for i in range(spec['requests'])
+    ]
+    return time_requests(lambda i: client.post('/update_entry', query_string=query, json=updates[i]),
+                         spec['requests'])
+
+
+BENCHMARKS = {
+    'parse_log': bench_parse_log,
+    'parse_files': bench_parse_files,
+    'ingest_full': bench_ingest_full,
+    'ingest_incremental': bench_ingest_incremental,
+    'get_metrics': bench_get_metrics,
+    'home_route': bench_home_route,
+    'update_entry': bench_update_entry,
+}
+# These start from a database that ingest_full has loaded
+NEEDS_DB = {'ingest_incremental', 'get_metrics', 'home_route', 'update_entry'}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux (bytes on macOS); children covers the parse pool
+    scale = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / scale
+
+
+def percentile(values, p):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+
+def summarize(result, base_rss):
+    latencies = result.pop('latencies')
+    seconds = sum(latencies)
+    summary = {
+        'items': result['items'],
+        'unit': result['unit'],
+        'seconds': round(seconds, 4),
+        'throughput': round(result['items'] / seconds, 1) if seconds else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'ops': len(latencies),
+        'base_rss_mb': round(base_rss, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    if 'bytes' in result:
+        summary['mb_per_sec'] = round(result['bytes'] / 1e6 / seconds, 2) if seconds else None
+    return summary
+
+
+def child_main(name, spec):
+    import app  # configured through the environment set by run_child()
+    app.LOG_DIR = spec['log_dir']
+    # Generated files are complete as soon as they are written
+    app.LOG_TAIL_IDLE_SECONDS = 0
+    # Migrations only; the benchmarks run ingestion themselves
+    app.ensure_db(start_jobs=False)
+    base_rss = peak_rss_mb()
+    result = summarize(BENCHMARKS[name](app, spec), base_rss)
+    with open(spec['result'], 'w') as f:
+        json.dump(result, f)
+
+
+# --- Driver ---
+def run_child(name, spec, workdir):
+    env = dict(os.environ, DATABASE_PATH=spec['db'], FLASK_SECRET_KEY='benchmark',
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    with open(os.path.join(workdir, 'child.log'), 'a') as log:
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.run', '--child', name, json.dumps(spec)],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    if proc.returncode:
+        raise SystemExit(f"{name} failed (exit {proc.returncode}); see {os.path.join(workdir, 'child.log')}")
+    with open(spec['result']) as f:
+        return json.load(f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args, workdir):
+    log_dir = os.path.join(workdir, 'querylogs')
+    db = os.path.join(workdir, 'bench.db')
+    shutil.rmtree(log_dir, ignore_errors=True)
+    for path in (db, db + '-wal', db + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)  # app.log lands here
+
+    print(f"Generating {args.records} records over {args.days} days in {log_dir} ...")
+    paths = write_logs(log_dir, args.records, args.days, args.seed)
+    meta = {
+        'records': args.records, 'days': args.days, 'seed': args.seed,
+        'workers': args.workers, 'requests': args.requests, 'repeat': args.repeat,
+        'log_bytes': sum(os.path.getsize(p) for p in paths),
+        'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(), 'cpus': os.cpu_count(),
+        'commit': git_commit(), 'timestamp': datetime.now().isoformat(timespec='seconds'),
+    }
+    base = {'log_dir': log_dir, 'records': args.records, 'days': args.days, 'seed': args.seed,
+            'workers': args.workers, 'requests': args.requests, 'repeat': args.repeat,
+            'result': os.path.join(workdir, 'result.json')}
+
+    selected = [name for name in BENCHMARKS if not args.only or name in args.only]
+    results = {}
+    for name in selected:
+        if name in NEEDS_DB and not os.path.exists(db):
+            print("Loading the database (ingest_full) ...")
+            run_child('ingest_full', dict(base, db=db), workdir)
+        if name == 'ingest_full':
+            runs = [(name, dict(base, db=db))]
+        elif name in ('home_route', 'get_metrics'):
+            runs = [(f"{name}[{label}]", dict(base, db=db, range_days=days)) for label, days in RANGES]
+        else:
+            # parse_log and parse_files never touch this database
+            runs = [(name, dict(base, db=db if name in NEEDS_DB else os.path.join(workdir, 'scratch.db')))]
+        for label, spec in runs:
+            print(f"Running {label} ...")
+            results[label] = run_child(name, spec, workdir)
+    return {'meta': meta, 'results': results}
+
+
+def print_table(report, baseline=None):
+    header = f"{'benchmark':<28} {'items':>9} {'throughput':>21} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>8}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for label, r in report['results'].items():
+        line = (f"{label:<28} {r['items']:>9} {r['throughput'] or 0:>11.1f} {r['unit'] + '/s':<9}"
+                f" {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['peak_rss_mb']:>8.1f}")
+        old = (baseline or {}).get('results', {}).get(label)
+        if old and old.get('throughput') and r['throughput']:
+            line += f" {r['throughput'] / old['throughput']:>7.2f}x"
+        print(line)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child_main(sys.argv[2], json.loads(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on a synthetic log set")
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=50, help="requests per route benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="passes for the parse and incremental benchmarks")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="run just these benchmarks")
+    parser.add_argument('--dir', help="working directory to use and keep (default: a temporary one)")
+    parser.add_argument('--out', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare throughput with")
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='qa-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        report = run_suite(args, workdir)
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('records') != args.records:
+            print(f"Note: the baseline used {baseline['meta'].get('records')} records.")
+    print_table(report, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()